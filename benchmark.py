@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, date
+import subprocess
+import tracemalloc
+import statistics
+import argparse
+import tempfile
+import random
+import shutil
+import json
+import time
+import sys
+import os
+
+import main
+
+try:
+    import resource
+
+except ImportError:
+    resource = None
+
+
+CJK_CHARS = "会议纪要预算审批项目进度报告合同发票照片视频日志数据统计客户需求设计方案"
+LATIN_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789_"
+EXTENSIONS = (".txt", ".md", ".csv", ".json", ".py", ".png", ".jpg", ".mp4", ".pdf", ".xlsx")
+TRACE_MEMORY = False
+
+
+def random_name(rng, length, cjk_ratio):
+    chars = [
+        rng.choice(CJK_CHARS) if rng.random() < cjk_ratio else rng.choice(LATIN_CHARS)
+        for _ in range(length)
+    ]
+    return "".join(chars) + rng.choice(EXTENSIONS)
+
+
+def generate_archive(root, args):
+    rng = random.Random(args.seed)
+    today = date.today()
+    start = today - timedelta(days=365 * args.years - 1)
+    day = start
+    files = 0
+
+    while day <= today:
+        day_dir = os.path.join(root, day.strftime("%Y"), day.strftime("%m"), day.strftime("%d"))
+        os.makedirs(day_dir, exist_ok=True)
+        for _ in range(args.files_per_day):
+            name = random_name(rng, args.name_length, args.cjk_ratio)
+            with open(os.path.join(day_dir, name), "w", encoding="utf-8") as f:
+                f.write(f"{name}\n预算 report line {rng.random()}\n")
+            files += 1
+
+        with open(os.path.join(day_dir, f"{day:%Y%m%d}.txt"), "w", encoding="utf-8") as f:
+            for i in range(3):
+                f.write(f"{day:%Y-%m-%d} 0{i}:00:00\nnote {i} 会议纪要 {rng.random()}\n\n")
+        files += 1
+        day += timedelta(days=1)
+
+    year = today.strftime("%Y")
+    with open(os.path.join(root, year, f"{year}.log"), "w", encoding="utf-8") as f:
+        labels = ("TEXT_SAVE", "FILE_UPLOAD", "FILE_DELETE", "FILE_COPY")
+        first = datetime(today.year, 1, 1)
+        span = max((datetime.now() - first).total_seconds(), 1)
+        for i in range(args.log_lines):
+            when = first + timedelta(seconds=span * i / args.log_lines)
+            f.write(f"time: {when:%Y-%m-%d %H:%M:%S}, type: {labels[i % 4]}, filename: file-{i}.txt\n")
+
+    large_text = os.path.join(root, today.strftime("%Y"), today.strftime("%m"), today.strftime("%d"), "large.csv")
+    line = "2026-01-01,预算,12345.67,some longer latin text for the csv column\n"
+    with open(large_text, "w", encoding="utf-8") as f:
+        for _ in range(args.large_text_mb * 1024 * 1024 // len(line.encode("utf-8"))):
+            f.write(line)
+
+    upload_dir = os.path.join(root, "_upload_source")
+    os.makedirs(upload_dir, exist_ok=True)
+    for i in range(args.upload_files):
+        with open(os.path.join(upload_dir, f"upload-{i}.bin"), "wb") as f:
+            f.write(os.urandom(args.upload_kb * 1024))
+
+    settle_mtimes(root)
+    return files + 1
+
+
+def settle_mtimes(root, age_seconds=60):
+    past = time.time() - age_seconds
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (past, past))
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(name, fn, repeat, items=1, nbytes=0, setup=None):
+    samples = []
+    rss_before = peak_rss_mb()
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    rss_after = peak_rss_mb()
+
+    py_peak = None
+    if TRACE_MEMORY:
+        if setup:
+            setup()
+        tracemalloc.start()
+        fn()
+        _, py_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    mean = statistics.fmean(samples)
+    return {
+        "name": name,
+        "repeat": repeat,
+        "p50_ms": pick(0.5) * 1000,
+        "p90_ms": pick(0.9) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "items_per_s": items / mean if mean else None,
+        "mb_per_s": nbytes / mean / (1024 * 1024) if mean and nbytes else None,
+        "peak_mb": rss_after,
+        "rss_growth_mb": rss_after - rss_before if rss_after is not None else None,
+        "py_peak_mb": py_peak / (1024 * 1024) if py_peak is not None else None
+    }
+
+
+def run_engine_benchmarks(root, args):
+    results = []
+    index = main.FileIndex(root, lambda name: "text")
+    results.append(measure("scan_cold", lambda: (
+        index.conn.execute("DELETE FROM dirs"), index.refresh()
+    ), 1))
+    results.append(measure("scan_warm", index.refresh, args.repeat))
+    results.append(measure("tree_load", lambda: index.load(date.today() - timedelta(days=90)), args.repeat))
+
+    text_index = main.TextIndex(root)
+    text_files = index.files_of_type("text")
+    results.append(measure("text_index_sync", lambda: text_index.sync(text_files), 1, items=len(text_files)))
+    results.append(measure("content_search", lambda: text_index.search("会议纪要"), args.repeat))
+
+    today = date.today()
+    large_text = os.path.join(root, today.strftime("%Y"), today.strftime("%m"), today.strftime("%d"), "large.csv")
+
+    def first_page():
+        pager = main.TextPager(large_text)
+        pager.next_page()
+        pager.next_page()
+        pager.close()
+
+    results.append(measure("preview_text_first_page", first_page, args.repeat))
+
+    year = today.strftime("%Y")
+    reader = main.LogReader(
+        os.path.join(root, year, f"{year}.log"), os.path.join(root, main.META_DIR, "logs", f"{year}.log.idx")
+    )
+    results.append(measure("log_newest_page", lambda: main.LogPager(reader, str).next_page(), args.repeat))
+    results.append(measure("log_query_month", lambda: list(reader.query({"FILE_UPLOAD"}, f"{year}-01")), args.repeat))
+
+    writer = main.LogWriter(root, print, flush_interval=0.05)
+    count = 2000
+
+    def write_burst():
+        for i in range(count):
+            writer.write("FILE_UPLOAD", {"filename": f"bench-{i}", "size": 1.0})
+        writer.flush()
+
+    results.append(measure("write_log_burst", write_burst, args.repeat, items=count))
+    writer.close()
+
+    sources = sorted(
+        os.path.join(root, "_upload_source", name) for name in os.listdir(os.path.join(root, "_upload_source"))
+    )
+    target_dir = os.path.join(root, main.META_DIR, "bench_upload")
+
+    def reset_target():
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.makedirs(target_dir)
+
+    def upload():
+        allocator = main.NameAllocator(target_dir)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            wait([
+                pool.submit(main.fast_copy, src, allocator.allocate(os.path.basename(src))) for src in sources
+            ])
+
+    nbytes = sum(os.path.getsize(src) for src in sources)
+    results.append(measure("upload_copy", upload, args.repeat, items=len(sources), nbytes=nbytes, setup=reset_target))
+
+    index.close()
+    text_index.close()
+    return results
+
+
+def start_virtual_display():
+    if os.environ.get("DISPLAY") or sys.platform.startswith("win") or sys.platform == "darwin":
+        return None
+
+    if not shutil.which("Xvfb"):
+        return None
+
+    display = ":97"
+    proc = subprocess.Popen(["Xvfb", display, "-screen", "0", "1600x900x24"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1)
+    os.environ["DISPLAY"] = display
+    return proc
+
+
+def pump(app, until, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while not until() and time.perf_counter() < deadline:
+        app.update()
+
+
+def run_ui_benchmarks(root, args):
+    xvfb = start_virtual_display()
+    if not os.environ.get("DISPLAY") and not sys.platform.startswith("win") and sys.platform != "darwin":
+        return [{"name": "ui", "skipped": "no display and Xvfb not available"}]
+
+    results = []
+    cwd = os.getcwd()
+    os.chdir(root)
+    app = main.ttkbs.Window(themename="flatly")
+    try:
+        start = time.perf_counter()
+        gui = main.QuanLog(app)
+        pump(app, lambda: gui.startup_ms is not None)
+        results.append({"name": "ui_startup", "p50_ms": (time.perf_counter() - start) * 1000,
+                        "time_to_interactive_ms": gui.startup_ms})
+
+        cache = gui.file_index.load(gui.ninety_days_ago)
+
+        def update_tree():
+            gui._update_file_tree(cache)
+            dates = sorted(cache, reverse=True)
+            pump(app, lambda: len(gui._date_nodes) == len(dates))
+
+        results.append(measure("ui_update_file_tree", update_tree, args.repeat))
+
+        def search():
+            for _ in gui._fast_search("bench", lambda: False):
+                pass
+
+        results.append(measure("fast_search", search, args.repeat))
+
+        large_text = os.path.join(gui.date_path, "large.csv")
+        results.append(measure("ui_preview_text", lambda: (gui._preview_text(large_text), app.update()), args.repeat))
+
+        def write_logs():
+            for i in range(1000):
+                gui.write_log("file", filename=f"bench-{i}", size=1.0)
+            gui.log_writer.flush()
+            app.update()
+
+        results.append(measure("ui_write_log", write_logs, args.repeat, items=1000))
+
+        upload_dir = os.path.join(root, "_upload_source")
+        sources = [os.path.join(upload_dir, name) for name in sorted(os.listdir(upload_dir))]
+        nbytes = sum(os.path.getsize(src) for src in sources)
+        results.append(measure("ui_upload_files", lambda: gui._upload_files(sources), 1,
+                               items=len(sources), nbytes=nbytes))
+        gui.stop()
+
+    finally:
+        app.destroy()
+        os.chdir(cwd)
+        if xvfb is not None:
+            xvfb.terminate()
+
+    return results
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for r in results:
+        old = baseline.get(r["name"])
+        if old and r.get("p50_ms") and old.get("p50_ms") and r["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{r['name']}: p50 {old['p50_ms']:.2f} ms -> {r['p50_ms']:.2f} ms")
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="QuanLog benchmark suite")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--files-per-day", type=int, default=20)
+    parser.add_argument("--name-length", type=int, default=16)
+    parser.add_argument("--cjk-ratio", type=float, default=0.3)
+    parser.add_argument("--large-text-mb", type=int, default=50)
+    parser.add_argument("--log-lines", type=int, default=200000)
+    parser.add_argument("--upload-files", type=int, default=200)
+    parser.add_argument("--upload-kb", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-ui", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep the generated archive")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="compare against a previous JSON result")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="run each benchmark once more under tracemalloc to report Python heap peaks")
+    args = parser.parse_args(argv)
+    global TRACE_MEMORY
+    TRACE_MEMORY = args.trace_memory
+
+    root = tempfile.mkdtemp(prefix="quanlog-bench-")
+    try:
+        start = time.perf_counter()
+        files = generate_archive(root, args)
+        results = [{"name": "generate_archive", "files": files, "p50_ms": (time.perf_counter() - start) * 1000}]
+        results += run_engine_benchmarks(root, args)
+        if not args.skip_ui:
+            results += run_ui_benchmarks(root, args)
+
+    finally:
+        if args.keep:
+            print(f"archive kept at {root}", file=sys.stderr)
+
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "config": vars(args),
+        "results": results
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    else:
+        print(text)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,29 +1,2669 @@
 # -*- coding: utf-8 -*-
 
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, namedtuple, Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, date
 from ttkbootstrap.dialogs import Messagebox
 from ttkbootstrap.constants import *
 from tkinter import filedialog
-from PIL import Image, ImageTk
 import ttkbootstrap as ttkbs
+import ctypes.util
 import subprocess
+import contextlib
 import threading
 import traceback
+import importlib
+import argparse
+import hashlib
+import sqlite3
 import tkinter
+import zipfile
+import bisect
+import codecs
+import ctypes
+import select
 import shutil
+import struct
+import heapq
+import errno
 import queue
+import json
+import math
+import mmap
+import zlib
 import time
-import cv2
+import sys
 import os
+import io
 import re
 
 
+PROCESS_START = time.perf_counter()
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    @property
+    def loaded(self):
+        return self.module is not None
+
+    def __getattr__(self, attr):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attr)
+
+
+cv2 = LazyModule("cv2")
+Image = LazyModule("PIL.Image")
+ImageTk = LazyModule("PIL.ImageTk")
+TiffImagePlugin = LazyModule("PIL.TiffImagePlugin")
+
+META_DIR = ".quanlog"
+MTIME_SETTLE_NS = 2_000_000_000
+TEXT_ENCODINGS = ("utf-8", "gbk", "gb2312", "utf-8-sig")
+LOG_TYPE_ALIASES = {
+    "text": "TEXT_SAVE",
+    "upload": "FILE_UPLOAD",
+    "delete": "FILE_DELETE",
+    "copy": "FILE_COPY"
+}
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+FICLONE = 0x40049409
+DAILY_NOTE_PATTERN = re.compile(r'^\d{8}\.txt$')
+PACK_PATTERN = re.compile(r'^\d{2}\.zip$')
+CJK_CLASS = "\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff"
+
+
+def fast_copy(src, dst, progress=None):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = 0
+        linux = sys.platform.startswith("linux")
+
+        if linux and size:
+            try:
+                import fcntl
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                copied = size
+                if progress:
+                    progress(size)
+
+            except (ImportError, OSError):
+                pass
+
+        for kernel_copy in ("copy_file_range", "sendfile"):
+            if copied or not linux or not hasattr(os, kernel_copy):
+                continue
+
+            try:
+                while copied < size:
+                    if kernel_copy == "copy_file_range":
+                        n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK_SIZE, copied, copied)
+
+                    else:
+                        n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, COPY_CHUNK_SIZE)
+                    if n == 0:
+                        break
+                    copied += n
+                    if progress:
+                        progress(n)
+
+            except OSError as e:
+                if copied and e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EBADF):
+                    raise
+
+        if copied < size:
+            fsrc.seek(copied)
+            fdst.seek(copied)
+            while True:
+                buf = fsrc.read(COPY_CHUNK_SIZE)
+                if not buf:
+                    break
+                fdst.write(buf)
+                if progress:
+                    progress(len(buf))
+
+    shutil.copystat(src, dst)
+    return size
+
+
+class NameAllocator:
+    def __init__(self, target_dir):
+        self.target_dir = target_dir
+        self.lock = threading.Lock()
+        try:
+            self.names = set(os.listdir(target_dir))
+
+        except FileNotFoundError:
+            self.names = set()
+        self._next = {}
+
+    def allocate(self, filename, overwrite=False):
+        with self.lock:
+            if overwrite or filename not in self.names:
+                self.names.add(filename)
+                return os.path.join(self.target_dir, filename)
+
+            name, ext = os.path.splitext(filename)
+            count = self._next.get(filename, 1)
+            while f"{name}-{count}{ext}" in self.names:
+                count += 1
+            self._next[filename] = count + 1
+            candidate = f"{name}-{count}{ext}"
+            self.names.add(candidate)
+            return os.path.join(self.target_dir, candidate)
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.blob_dir = os.path.join(root, META_DIR, "blobs")
+        self.tmp_dir = os.path.join(self.blob_dir, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, META_DIR, "blobs.db"), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS refs (path TEXT PRIMARY KEY, hash TEXT NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS refs_hash ON refs(hash)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs "
+                "(hash TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)"
+            )
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _intact(self, digest, blob):
+        row = self.conn.execute("SELECT size, mtime_ns FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        try:
+            st = os.stat(blob)
+
+        except FileNotFoundError:
+            return False
+
+        if row is not None and row == (st.st_size, st.st_mtime_ns):
+            return True
+
+        self.conn.execute("DELETE FROM refs WHERE hash = ?", (digest,))
+        self.conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        os.remove(blob)
+        return False
+
+    def store(self, src, target, progress=None):
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.tmp_dir, f"{threading.get_ident()}-{time.monotonic_ns()}")
+        try:
+            with open(src, "rb") as fsrc, open(tmp_path, "wb") as ftmp:
+                while True:
+                    buf = fsrc.read(COPY_CHUNK_SIZE)
+                    if not buf:
+                        break
+                    digest.update(buf)
+                    ftmp.write(buf)
+                    if progress:
+                        progress(len(buf))
+
+            digest = digest.hexdigest()
+            blob = self.blob_path(digest)
+            with self.lock, self.conn:
+                reused = self._intact(digest, blob)
+                if not reused:
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    shutil.copystat(src, tmp_path)
+                    os.replace(tmp_path, blob)
+                    st = os.stat(blob)
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (digest, st.st_size, st.st_mtime_ns)
+                    )
+
+                try:
+                    os.link(blob, target)
+
+                except OSError:
+                    fast_copy(blob, target)
+                self.conn.execute("INSERT OR REPLACE INTO refs VALUES (?, ?)", (target, digest))
+            return reused
+
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def rename(self, old_path, new_path):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE OR REPLACE refs SET path = ? WHERE path = ?", (new_path, old_path))
+
+    def release(self, path):
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT hash FROM refs WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return
+            self.conn.execute("DELETE FROM refs WHERE path = ?", (path,))
+            if self.conn.execute("SELECT 1 FROM refs WHERE hash = ? LIMIT 1", row).fetchone() is None:
+                self.conn.execute("DELETE FROM blobs WHERE hash = ?", row)
+                try:
+                    os.remove(self.blob_path(row[0]))
+
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+PackStat = namedtuple("PackStat", "st_size st_mtime st_mtime_ns")
+
+
+def split_pack_path(fp):
+    day_dir, name = os.path.split(fp)
+    pack_path, day = os.path.split(day_dir)
+    if name and len(day) == 2 and day.isdigit() and PACK_PATTERN.match(os.path.basename(pack_path)):
+        return pack_path, f"{day}/{name}"
+    return None
+
+
+class PackReader:
+    def __init__(self, max_open=16):
+        self.max_open = max_open
+        self.lock = threading.Lock()
+        self._handles = OrderedDict()
+
+    def _zip(self, pack_path):
+        st = os.stat(pack_path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        with self.lock:
+            entry = self._handles.get(pack_path)
+            if entry is not None and entry[0] == stamp:
+                self._handles.move_to_end(pack_path)
+                return entry[1]
+
+            zf = zipfile.ZipFile(pack_path)
+            if entry is not None:
+                entry[1].close()
+            self._handles[pack_path] = (stamp, zf)
+            while len(self._handles) > self.max_open:
+                _, (_, old) = self._handles.popitem(last=False)
+                old.close()
+            return zf
+
+    def forget(self, pack_path):
+        with self.lock:
+            entry = self._handles.pop(pack_path, None)
+        if entry is not None:
+            entry[1].close()
+
+    def members(self, pack_path):
+        return [info for info in self._zip(pack_path).infolist() if not info.is_dir()]
+
+    def exists(self, fp):
+        pack_path, member = split_pack_path(fp)
+        try:
+            self._zip(pack_path).getinfo(member)
+            return True
+
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return False
+
+    def stat(self, fp):
+        pack_path, member = split_pack_path(fp)
+        info = self._zip(pack_path).getinfo(member)
+        mtime = datetime(*info.date_time).timestamp()
+        return PackStat(info.file_size, mtime, int(mtime * 1_000_000_000))
+
+    def open(self, fp):
+        pack_path, member = split_pack_path(fp)
+        return self._zip(pack_path).open(member)
+
+    def read(self, fp):
+        with self.open(fp) as f:
+            return f.read()
+
+    def close(self):
+        with self.lock:
+            handles, self._handles = self._handles, OrderedDict()
+        for _, zf in handles.values():
+            zf.close()
+
+
+packs = PackReader()
+
+
+def path_exists(fp):
+    return packs.exists(fp) if split_pack_path(fp) else os.path.isfile(fp)
+
+
+def stat_path(fp):
+    return packs.stat(fp) if split_pack_path(fp) else os.stat(fp)
+
+
+def open_path(fp):
+    return packs.open(fp) if split_pack_path(fp) else open(fp, "rb")
+
+
+image_open_lock = threading.Lock()
+
+
+def open_image(src, max_pixels=None):
+    with image_open_lock:
+        if max_pixels is None:
+            return Image.open(src)
+
+        pil = importlib.import_module("PIL.Image")
+        saved = pil.MAX_IMAGE_PIXELS
+        pil.MAX_IMAGE_PIXELS = None if saved is None else max(saved, max_pixels)
+        try:
+            img = Image.open(src)
+
+        finally:
+            pil.MAX_IMAGE_PIXELS = saved
+
+    if img.size[0] * img.size[1] > max_pixels:
+        img.close()
+        raise ValueError(f"{img.size[0]}x{img.size[1]} exceeds the {max_pixels // 1_000_000} MP limit")
+    return img
+
+
+class ColdStorage:
+    STORED_EXTS = {
+        ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm",
+        ".zip", ".rar", ".7z", ".gz", ".docx", ".xlsx", ".pptx"
+    }
+
+    def __init__(self, root, reader=packs):
+        self.root = root
+        self.reader = reader
+        self.unpack_dir = os.path.join(root, META_DIR, "unpacked")
+
+    def due_months(self, min_age_days, today=None):
+        cutoff = (today or date.today()) - timedelta(days=min_age_days)
+        months = []
+        if not os.path.isdir(self.root):
+            return months
+
+        with os.scandir(self.root) as years:
+            for year in years:
+                if not (year.name.isdigit() and len(year.name) == 4 and year.is_dir()):
+                    continue
+
+                with os.scandir(year.path) as entries:
+                    for month in entries:
+                        if not (month.name.isdigit() and len(month.name) == 2 and month.is_dir()):
+                            continue
+
+                        y, m = int(year.name), int(month.name)
+                        if 1 <= m <= 12 and date(y + m // 12, m % 12 + 1, 1) <= cutoff:
+                            months.append(month.path)
+        return sorted(months)
+
+    @staticmethod
+    def _crc(path):
+        crc = 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                crc = zlib.crc32(chunk, crc)
+        return crc
+
+    def pack_month(self, month_path, cancelled=lambda: False):
+        pack_path = month_path + ".zip"
+        tmp_path = f"{pack_path}.{threading.get_ident()}.tmp"
+        packed = []
+        try:
+            if os.path.exists(pack_path):
+                fast_copy(pack_path, tmp_path)
+
+            with zipfile.ZipFile(tmp_path, "a" if os.path.exists(tmp_path) else "w", allowZip64=True) as zf:
+                existing = {info.filename: (info.file_size, info.CRC) for info in zf.infolist()}
+                with os.scandir(month_path) as days:
+                    day_dirs = sorted(d.path for d in days if d.name.isdigit() and len(d.name) == 2 and d.is_dir())
+
+                for day_path in day_dirs:
+                    day = os.path.basename(day_path)
+                    with os.scandir(day_path) as entries:
+                        files = sorted((e.name, e.path) for e in entries if e.is_file())
+
+                    for name, path in files:
+                        if cancelled():
+                            raise InterruptedError
+
+                        arcname = f"{day}/{name}"
+                        size = os.path.getsize(path)
+                        if arcname in existing and existing[arcname] == (size, self._crc(path)):
+                            packed.append(path)
+                            continue
+
+                        stem, ext = os.path.splitext(name)
+                        count = 1
+                        while arcname in existing:
+                            arcname = f"{day}/{stem}-{count}{ext}"
+                            count += 1
+
+                        compress = zipfile.ZIP_STORED if ext.lower() in self.STORED_EXTS else zipfile.ZIP_DEFLATED
+                        zf.write(path, arcname, compress_type=compress)
+                        existing[arcname] = (zf.getinfo(arcname).file_size, zf.getinfo(arcname).CRC)
+                        packed.append(path)
+
+            if not packed:
+                os.remove(tmp_path)
+                return None, []
+
+            with open(tmp_path, "rb+") as f:
+                os.fsync(f.fileno())
+            self.reader.forget(pack_path)
+            os.replace(tmp_path, pack_path)
+
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+
+            except OSError:
+                pass
+            raise
+
+        for path in packed:
+            os.remove(path)
+        for day_path in sorted({os.path.dirname(p) for p in packed}) + [month_path]:
+            try:
+                os.rmdir(day_path)
+
+            except OSError:
+                pass
+        return pack_path, packed
+
+    def remove(self, fp):
+        pack_path, member = split_pack_path(fp)
+        tmp_path = f"{pack_path}.{threading.get_ident()}.tmp"
+        remaining = 0
+        with zipfile.ZipFile(pack_path) as src, zipfile.ZipFile(tmp_path, "w", allowZip64=True) as dst:
+            for info in src.infolist():
+                if info.filename == member:
+                    continue
+                with src.open(info) as fsrc, dst.open(info, "w") as fdst:
+                    shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+                remaining += 1
+
+        self.reader.forget(pack_path)
+        if remaining:
+            with open(tmp_path, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, pack_path)
+
+        else:
+            os.remove(tmp_path)
+            os.remove(pack_path)
+
+    def materialize(self, fp):
+        if split_pack_path(fp) is None:
+            return fp
+
+        digest = hashlib.sha1(fp.encode("utf-8")).hexdigest()[:16]
+        target = os.path.join(self.unpack_dir, digest, os.path.basename(fp))
+        if os.path.isfile(target) and os.path.getsize(target) == self.reader.stat(fp).st_size:
+            os.utime(target)
+            return target
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        with self.reader.open(fp) as fsrc, open(tmp_path, "wb") as fdst:
+            shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+        os.replace(tmp_path, target)
+        return target
+
+    def purge_unpacked(self, max_age_seconds=24 * 3600):
+        if not os.path.isdir(self.unpack_dir):
+            return
+
+        cutoff = time.time() - max_age_seconds
+        with os.scandir(self.unpack_dir) as entries:
+            for entry in entries:
+                try:
+                    if all(e.stat().st_mtime < cutoff for e in os.scandir(entry.path)):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+
+                except OSError:
+                    continue
+
+
+class PreviewCache:
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total = 0
+
+    @staticmethod
+    def key(fp, *extra):
+        st = stat_path(fp)
+        return (fp, st.st_size, st.st_mtime_ns) + extra
+
+    @staticmethod
+    def _cost(value):
+        if isinstance(value, tuple) and value and isinstance(value[0], str):
+            return len(value[0]) * 2 + 64
+        if hasattr(value, "size") and hasattr(value, "getbands"):
+            return value.size[0] * value.size[1] * len(value.getbands()) + 64
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(
+                sys.getsizeof(spans) + sum(sys.getsizeof(index) for index in spans) for spans in value.values()
+            )
+        return 64
+
+    def get(self, key):
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        cost = self._cost(value)
+        if cost > self.max_bytes:
+            return
+
+        with self.lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            self._entries[key] = (value, cost)
+            self._total += cost
+            while self._total > self.max_bytes:
+                _, (_, evicted_cost) = self._entries.popitem(last=False)
+                self._total -= evicted_cost
+
+
+class ThumbnailCache:
+    def __init__(self, root, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = os.path.join(root, META_DIR, "thumbs")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._total = None
+
+    def _path(self, fp, box):
+        st = stat_path(fp)
+        key = f"{os.path.abspath(fp)}|{box[0]}x{box[1]}|{st.st_size}|{st.st_mtime_ns}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+    @staticmethod
+    def render(fp, box):
+        img = open_image(io.BytesIO(packs.read(fp)) if split_pack_path(fp) else fp)
+        if img.format == "JPEG":
+            img.draft("RGB", box)
+        img.thumbnail(box, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        return img
+
+    def get(self, fp, box):
+        path = self._path(fp, box)
+        try:
+            img = Image.open(path)
+            img.load()
+            os.utime(path)
+            return img
+
+        except (OSError, ValueError):
+            pass
+
+        img = self.render(fp, box)
+        self.put(path, img)
+        return img
+
+    def put(self, path, img):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, "PNG")
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self._total is None:
+                self._total = sum(e.stat().st_size for e in os.scandir(self.cache_dir) if e.is_file())
+
+            else:
+                self._total += os.path.getsize(path)
+
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (e for e in os.scandir(self.cache_dir) if e.is_file()),
+            key=lambda e: e.stat().st_mtime
+        )
+        total = sum(e.stat().st_size for e in entries)
+        target = self.max_bytes * 0.8
+        for entry in entries:
+            if total <= target:
+                break
+
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+
+            except OSError:
+                continue
+        self._total = total
+
+
+class TilePyramid:
+    TILE_SIZE = 256
+    MAX_PIXELS = 500_000_000
+    MAX_DECODE_PIXELS = 50_000_000
+    RAW_BYTES = {"L": 1, "LA": 2, "RGB": 3, "BGR": 3, "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4}
+    TIFF_CHUNK_TAGS = (258, 259, 262, 277, 284, 317, 320, 338, 339, 347, 530, 532)
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = os.path.join(root, META_DIR, "tiles")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._level_locks = {}
+        self._total = None
+
+    @classmethod
+    def _open(cls, f):
+        return open_image(f, cls.MAX_PIXELS)
+
+    @classmethod
+    def image_size(cls, fp):
+        with open_path(fp) as f, cls._open(f) as img:
+            return img.size
+
+    @staticmethod
+    def level_size(info, level):
+        scale = 2 ** level
+        return -(-info["width"] // scale), -(-info["height"] // scale)
+
+    def entry_dir(self, fp):
+        st = stat_path(fp)
+        key = f"{os.path.abspath(fp)}|{st.st_size}|{st.st_mtime_ns}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def info(self, fp):
+        entry = self.entry_dir(fp)
+        path = os.path.join(entry, "info.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            if "min_level" not in info:
+                raise ValueError("stale tile info")
+            os.utime(path)
+
+        except (OSError, ValueError, KeyError):
+            with open_path(fp) as f, self._open(f) as img:
+                w, h = img.size
+                min_level = self._min_level(img)
+            if min_level is None:
+                raise ValueError(f"{w}x{h} cannot be decoded within {self.MAX_DECODE_PIXELS // 1_000_000} MP")
+
+            levels = max(0, math.ceil(math.log2(max(w, h) / self.TILE_SIZE))) if max(w, h) > self.TILE_SIZE else 0
+            info = {"width": w, "height": h, "levels": max(levels, min_level), "min_level": min_level}
+            os.makedirs(entry, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(info, f)
+
+        info["entry"] = entry
+        return info
+
+    def _min_level(self, img):
+        pixels = img.size[0] * img.size[1]
+        if pixels <= self.MAX_DECODE_PIXELS or self._raw_layout(img) is not None or self._tiff_chunks(img) is not None:
+            return 0
+
+        if img.format == "JPEG":
+            for level in range(1, 4):
+                if pixels / 4 ** level <= self.MAX_DECODE_PIXELS:
+                    return level
+        return None
+
+    def has_level(self, info, level):
+        return os.path.exists(os.path.join(info["entry"], str(level), ".done"))
+
+    def tile(self, fp, info, level, col, row):
+        path = os.path.join(info["entry"], str(level), f"{col}_{row}.png")
+        if not os.path.exists(path):
+            self.build_level(fp, info, level)
+        img = Image.open(path)
+        img.load()
+        return img
+
+    def build_level(self, fp, info, level):
+        if level < info["min_level"]:
+            raise ValueError(f"level {level} is below the finest decodable level {info['min_level']}")
+
+        level_dir = os.path.join(info["entry"], str(level))
+        with self.lock:
+            lock = self._level_locks.setdefault(level_dir, threading.Lock())
+
+        with lock:
+            if self.has_level(info, level):
+                return
+
+            os.makedirs(level_dir, exist_ok=True)
+            if level == 0:
+                self._build_base(fp, level_dir)
+
+            elif not self._build_drafted(fp, info, level, level_dir):
+                self._build_from_finer(fp, info, level, level_dir)
+            open(os.path.join(level_dir, ".done"), "wb").close()
+        self._account(info["entry"], self._dir_size(level_dir))
+
+    @staticmethod
+    def _dir_size(path):
+        total = 0
+        for dirpath, _, names in os.walk(path):
+            for name in names:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+
+                except OSError:
+                    continue
+        return total
+
+    def _account(self, keep, nbytes):
+        with self.lock:
+            if self._total is None:
+                self._total = self._dir_size(self.cache_dir)
+
+            else:
+                self._total += nbytes
+
+            if self._total > self.max_bytes:
+                self._evict(keep)
+
+    def _evict(self, keep):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.path == keep or not entry.is_dir():
+                continue
+
+            try:
+                entries.append((os.stat(os.path.join(entry.path, "info.json")).st_mtime, entry.path))
+
+            except OSError:
+                entries.append((0, entry.path))
+
+        total = self._dir_size(self.cache_dir)
+        target = self.max_bytes * 0.8
+        for _, path in sorted(entries):
+            if total <= target:
+                break
+
+            size = self._dir_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        self._total = total
+
+    @staticmethod
+    def _normalize(img):
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        return img
+
+    def _save_tiles(self, img, level_dir, top):
+        size = self.TILE_SIZE
+        for y in range(0, img.size[1], size):
+            for x in range(0, img.size[0], size):
+                tile = img.crop((x, y, min(x + size, img.size[0]), min(y + size, img.size[1])))
+                path = os.path.join(level_dir, f"{x // size}_{(top + y) // size}.png")
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                tile.save(tmp_path, "PNG", compress_level=1)
+                os.replace(tmp_path, path)
+
+    def _raw_layout(self, img):
+        layout = []
+        for codec, extents, offset, args in img.tile:
+            rawmode, stride, orientation = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+            bpp = self.RAW_BYTES.get(rawmode)
+            if codec != "raw" or bpp is None or orientation not in (1, -1):
+                return None
+
+            x0, y0, x1, y1 = extents
+            layout.append((x0, y0, x1, y1, offset, rawmode, stride or (x1 - x0) * bpp, orientation))
+        return layout or None
+
+    @staticmethod
+    def _read_band(f, mode, width, layout, y0, y1):
+        band = Image.new(mode, (width, y1 - y0))
+        for x0, top, x1, bottom, offset, rawmode, stride, orientation in layout:
+            first, last = max(top, y0), min(bottom, y1)
+            if first >= last:
+                continue
+
+            rows = last - first
+            f.seek(offset + (first - top if orientation == 1 else bottom - last) * stride)
+            part = Image.frombuffer(mode, (x1 - x0, rows), f.read(rows * stride), "raw", rawmode, stride, orientation)
+            band.paste(part, (x0, first - y0))
+        return band
+
+    def _tiff_chunks(self, img):
+        if img.format != "TIFF" or img.tag_v2.get(284, 1) != 1:
+            return None
+
+        tags = img.tag_v2
+        width, height = img.size
+        if 324 in tags:
+            cw, ch, offsets, counts = tags.get(322), tags.get(323), tags.get(324), tags.get(325)
+
+        else:
+            cw, ch, offsets, counts = width, min(tags.get(278, height), height), tags.get(273), tags.get(279)
+        if not cw or not ch or not offsets or not counts or len(offsets) != len(counts):
+            return None
+
+        across = -(-width // cw)
+        if len(offsets) < across * -(-height // ch) or across * cw * ch > self.MAX_DECODE_PIXELS:
+            return None
+
+        chunks = []
+        for i in range(across * -(-height // ch)):
+            x0, y0 = i % across * cw, i // across * ch
+            chunks.append((x0, y0, min(x0 + cw, width), min(y0 + ch, height), offsets[i], counts[i]))
+        return chunks
+
+    def _decode_chunk(self, f, tags, chunk):
+        x0, y0, x1, y1, offset, nbytes = chunk
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(prefix=b"II")
+        for tag in self.TIFF_CHUNK_TAGS:
+            if tag in tags:
+                ifd[tag] = tags[tag]
+        width, height = (tags[322], tags[323]) if 324 in tags else (x1 - x0, y1 - y0)
+        ifd[256], ifd[257], ifd[278] = width, height, height
+        # tobytes() writes strip offsets relative to the end of the directory, where the data follows
+        ifd[273], ifd[279] = (0,), (nbytes,)
+        f.seek(offset)
+        data = b"II*\x00" + struct.pack("<I", 8) + ifd.tobytes(8) + f.read(nbytes)
+        with Image.open(io.BytesIO(data)) as part:
+            part.load()
+            return part.crop((0, 0, x1 - x0, y1 - y0))
+
+    def _read_chunk_band(self, f, img, chunks, decoded, y0, y1):
+        for index in [index for index in decoded if chunks[index][3] <= y0]:
+            del decoded[index]
+
+        band = Image.new(img.mode, (img.size[0], y1 - y0))
+        for index, chunk in enumerate(chunks):
+            x0, top, _, bottom = chunk[:4]
+            if bottom <= y0 or top >= y1:
+                continue
+
+            if index not in decoded:
+                decoded[index] = self._decode_chunk(f, img.tag_v2, chunk)
+            first, last = max(top, y0), min(bottom, y1)
+            band.paste(decoded[index].crop((0, first - top, chunk[2] - x0, last - top)), (x0, first - y0))
+        return band
+
+    def _build_base(self, fp, level_dir):
+        with open_path(fp) as f, self._open(f) as img:
+            width, height = img.size
+            tops = range(0, height, self.TILE_SIZE)
+            layout = self._raw_layout(img)
+            if layout is not None:
+                for top in (reversed(tops) if all(entry[-1] == -1 for entry in layout) else tops):
+                    band = self._read_band(f, img.mode, width, layout, top, min(top + self.TILE_SIZE, height))
+                    self._save_tiles(self._normalize(band), level_dir, top)
+                return
+
+            chunks = self._tiff_chunks(img)
+            if chunks is None:
+                self._save_tiles(self._normalize(img), level_dir, 0)
+                return
+
+            decoded = {}
+            for top in tops:
+                band = self._read_chunk_band(f, img, chunks, decoded, top, min(top + self.TILE_SIZE, height))
+                self._save_tiles(self._normalize(band), level_dir, top)
+
+    def _build_drafted(self, fp, info, level, level_dir):
+        with open_path(fp) as f, self._open(f) as img:
+            if img.format != "JPEG" or level > 3:
+                return False
+
+            size = self.level_size(info, level)
+            img.draft("RGB", size)
+            scaled = self._normalize(img)
+            if scaled.size != size:
+                scaled = scaled.resize(size, Image.Resampling.LANCZOS)
+            self._save_tiles(scaled, level_dir, 0)
+        return True
+
+    def _build_from_finer(self, fp, info, level, level_dir):
+        finer = level - 1
+        self.build_level(fp, info, finer)
+        size = self.TILE_SIZE
+        fw, fh = self.level_size(info, finer)
+        lw, lh = self.level_size(info, level)
+        for row in range(-(-lh // size)):
+            for col in range(-(-lw // size)):
+                block = None
+                for dy in (0, 1):
+                    for dx in (0, 1):
+                        c, r = col * 2 + dx, row * 2 + dy
+                        if c * size >= fw or r * size >= fh:
+                            continue
+                        child = self.tile(fp, info, finer, c, r)
+                        if block is None:
+                            block = Image.new(child.mode, (min(2 * size, fw - col * 2 * size),
+                                                           min(2 * size, fh - row * 2 * size)))
+                        block.paste(child, (dx * size, dy * size))
+
+                tile = block.resize((-(-block.size[0] // 2), -(-block.size[1] // 2)), Image.Resampling.LANCZOS)
+                path = os.path.join(level_dir, f"{col}_{row}.png")
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                tile.save(tmp_path, "PNG", compress_level=1)
+                os.replace(tmp_path, path)
+
+
+class VideoThumbnailer:
+    STRIP_COUNT = 8
+    STRIP_SIZE = (96, 54)
+
+    def __init__(self, root):
+        self.cache_dir = os.path.join(root, META_DIR, "video")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def entry_dir(self, fp):
+        st = os.stat(fp)
+        key = f"{os.path.abspath(fp)}|{st.st_size}|{st.st_mtime_ns}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    @staticmethod
+    def _read_meta(entry):
+        try:
+            with open(os.path.join(entry, "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _mark_failed(entry):
+        os.makedirs(entry, exist_ok=True)
+        with open(os.path.join(entry, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"failed": True}, f)
+
+    def get(self, fp):
+        entry = self.entry_dir(fp)
+        meta = self._read_meta(entry)
+        if meta is None or meta.get("failed"):
+            return None
+
+        meta["poster"] = os.path.join(entry, "poster.jpg")
+        meta["strip"] = [
+            (ms, os.path.join(entry, f"strip_{i:02d}.jpg")) for i, ms in enumerate(meta["positions"])
+        ]
+        return meta
+
+    @staticmethod
+    def _grab(cap, frame_index):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        ret, frame = cap.read()
+        return frame if ret else None
+
+    def extract(self, fp, poster_box):
+        entry = self.entry_dir(fp)
+        if self._read_meta(entry) is not None:
+            return self.get(fp)
+
+        cap = cv2.VideoCapture(fp)
+        try:
+            if not cap.isOpened():
+                self._mark_failed(entry)
+                return None
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if frame_count <= 0:
+                self._mark_failed(entry)
+                return None
+
+            tmp_entry = f"{entry}.{threading.get_ident()}.tmp"
+            os.makedirs(tmp_entry, exist_ok=True)
+            poster = self._grab(cap, frame_count // 10)
+            if poster is None:
+                poster = self._grab(cap, 0)
+            if poster is None:
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+                self._mark_failed(entry)
+                return None
+
+            h, w = poster.shape[:2]
+            scale = min(poster_box[0] / w, poster_box[1] / h, 1.0)
+            cv2.imwrite(
+                os.path.join(tmp_entry, "poster.jpg"),
+                cv2.resize(poster, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+            )
+
+            positions = []
+            for i in range(self.STRIP_COUNT):
+                frame_index = frame_count * i // self.STRIP_COUNT
+                frame = self._grab(cap, frame_index)
+                if frame is None:
+                    break
+                cv2.imwrite(
+                    os.path.join(tmp_entry, f"strip_{i:02d}.jpg"),
+                    cv2.resize(frame, self.STRIP_SIZE, interpolation=cv2.INTER_AREA)
+                )
+                positions.append(int(frame_index * 1000 / fps))
+
+            with open(os.path.join(tmp_entry, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"duration_ms": int(frame_count * 1000 / fps), "positions": positions}, f)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_entry, entry)
+
+        finally:
+            cap.release()
+
+        return self.get(fp)
+
+
+class VideoProxyCache:
+    def __init__(self, root):
+        self.cache_dir = os.path.join(root, META_DIR, "proxy")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def proxy_path(self, fp):
+        st = os.stat(fp)
+        key = f"{os.path.abspath(fp)}|{st.st_size}|{st.st_mtime_ns}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".mp4")
+
+    def get(self, fp):
+        path = self.proxy_path(fp)
+        return path if os.path.isfile(path) else None
+
+    def generate(self, fp, box, cancelled=lambda: False):
+        path = self.proxy_path(fp)
+        if os.path.isfile(path):
+            return path
+
+        cap = cv2.VideoCapture(fp)
+        writer = None
+        tmp_path = f"{path[:-4]}.{threading.get_ident()}.tmp.mp4"
+        try:
+            if not cap.isOpened():
+                return None
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            scale = min(box[0] / w, box[1] / h, 1.0) if w and h else 1.0
+            if scale >= 1.0:
+                return None
+
+            size = (max(int(w * scale) // 2 * 2, 2), max(int(h * scale) // 2 * 2, 2))
+            writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+            if not writer.isOpened():
+                return None
+
+            while not cancelled():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+
+            else:
+                return None
+
+            writer.release()
+            writer = None
+            os.replace(tmp_path, path)
+            return path
+
+        finally:
+            cap.release()
+            if writer is not None:
+                writer.release()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class Metrics:
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self, sample_size=512):
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.timings = {}
+        self.gauges = {}
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        ms = seconds * 1000
+        with self.lock:
+            stat = self.timings.get(name)
+            if stat is None:
+                stat = self.timings[name] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "buckets": [0] * (len(self.BUCKETS_MS) + 1),
+                    "recent": deque(maxlen=self.sample_size)
+                }
+            stat["count"] += 1
+            stat["total_ms"] += ms
+            stat["max_ms"] = max(stat["max_ms"], ms)
+            stat["buckets"][bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+            stat["recent"].append(ms)
+
+    def gauge(self, name, value):
+        with self.lock:
+            stat = self.gauges.setdefault(name, {"value": 0, "max": 0, "count": 0, "total": 0})
+            stat["value"] = value
+            stat["max"] = max(stat["max"], value)
+            stat["count"] += 1
+            stat["total"] += value
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.timings.clear()
+            self.gauges.clear()
+
+    @classmethod
+    def bucket_labels(cls):
+        return [f"<={b}ms" for b in cls.BUCKETS_MS] + [f">{cls.BUCKETS_MS[-1]}ms"]
+
+    def snapshot(self):
+        labels = self.bucket_labels()
+        with self.lock:
+            timings = {}
+            for name, stat in self.timings.items():
+                recent = sorted(stat["recent"])
+                pick = lambda q: recent[min(len(recent) - 1, int(q * len(recent)))]
+                timings[name] = {
+                    "count": stat["count"],
+                    "mean_ms": stat["total_ms"] / stat["count"],
+                    "p50_ms": pick(0.5),
+                    "p90_ms": pick(0.9),
+                    "p99_ms": pick(0.99),
+                    "max_ms": stat["max_ms"],
+                    "histogram": {label: n for label, n in zip(labels, stat["buckets"]) if n}
+                }
+
+            gauges = {
+                name: {"value": stat["value"], "max": stat["max"], "mean": stat["total"] / stat["count"]}
+                for name, stat in self.gauges.items()
+            }
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "uptime_s": round(time.time() - self.started, 1),
+                "timings": timings,
+                "gauges": gauges
+            }
+
+    def export(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        return path
+
+
+class FileIndex:
+    def __init__(self, root, classify):
+        self.root = root
+        self.classify = classify
+        self.lock = threading.Lock()
+        meta_dir = os.path.join(root, META_DIR)
+        os.makedirs(meta_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(meta_dir, "index.db"), check_same_thread=False)
+        self.conn.create_function("py_lower", 1, str.lower, deterministic=True)
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    date_str TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    type TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS files_date ON files(date_str);
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY,
+                    date_str TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                );
+            """)
+
+    @staticmethod
+    def _is_bucket(entry, length):
+        return entry.name.isdigit() and len(entry.name) == length and entry.is_dir()
+
+    def _iter_day_dirs(self):
+        if not os.path.isdir(self.root):
+            return
+
+        with os.scandir(self.root) as years:
+            for year in years:
+                if not self._is_bucket(year, 4):
+                    continue
+
+                with os.scandir(year.path) as months:
+                    for month in months:
+                        if not self._is_bucket(month, 2):
+                            continue
+
+                        with os.scandir(month.path) as days:
+                            for day in days:
+                                if self._is_bucket(day, 2):
+                                    yield f"{year.name}-{month.name}-{day.name}", day
+
+    def _iter_packs(self):
+        if not os.path.isdir(self.root):
+            return
+
+        with os.scandir(self.root) as years:
+            for year in years:
+                if not self._is_bucket(year, 4):
+                    continue
+
+                with os.scandir(year.path) as entries:
+                    for entry in entries:
+                        if PACK_PATTERN.match(entry.name) and entry.is_file():
+                            yield f"{year.name}-{entry.name[:2]}", entry
+
+    def _scan_day(self, date_str, day_path):
+        rows = []
+        with os.scandir(day_path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".log") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                rows.append((
+                    entry.path, date_str, entry.name, st.st_size, st.st_mtime, self.classify(entry.name)
+                ))
+        return rows
+
+    def _scan_pack(self, month_str, pack_path):
+        rows = []
+        for info in packs.members(pack_path):
+            day, _, name = info.filename.partition("/")
+            if not name or "/" in name or name.endswith(".log"):
+                continue
+            rows.append((
+                os.path.join(pack_path, day, name), f"{month_str}-{day}", name, info.file_size,
+                datetime(*info.date_time).timestamp(), self.classify(name)
+            ))
+        return rows
+
+    def _delete_under(self, path):
+        self.conn.execute(
+            "DELETE FROM files WHERE path >= ? AND path < ?", (path + os.sep, path + chr(ord(os.sep) + 1))
+        )
+
+    def refresh(self):
+        with self.lock:
+            known = {path: (date_str, mtime_ns) for path, date_str, mtime_ns in self.conn.execute(
+                "SELECT path, date_str, mtime_ns FROM dirs"
+            )}
+
+        seen = set()
+        changed = []
+        sources = [(d, e, self._scan_day) for d, e in self._iter_day_dirs()]
+        sources += [(m, e, self._scan_pack) for m, e in self._iter_packs()]
+        for date_str, entry, scan in sources:
+            seen.add(entry.path)
+            mtime_ns = entry.stat().st_mtime_ns
+            if known.get(entry.path, (None, None))[1] != mtime_ns:
+                rows = scan(date_str, entry.path)
+                if time.time_ns() - mtime_ns < MTIME_SETTLE_NS:
+                    mtime_ns = -1
+                changed.append((date_str, entry.path, mtime_ns, rows))
+        gone = [p for p in known if p not in seen]
+
+        if not changed and not gone:
+            return False
+
+        with self.lock, self.conn:
+            for path in gone:
+                self._delete_under(path)
+                self.conn.execute("DELETE FROM dirs WHERE path = ?", (path,))
+
+            for date_str, path, mtime_ns, rows in changed:
+                self._delete_under(path)
+                self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self.conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (path, date_str, mtime_ns))
+        return True
+
+    def date_of(self, path):
+        parts = os.path.relpath(path, self.root).split(os.sep)
+        if len(parts) == 4 and PACK_PATTERN.match(parts[1]):
+            parts[1] = parts[1][:2]
+        if len(parts) != 4 or not all(p.isdigit() for p in parts[:3]):
+            return None
+        return f"{parts[0]}-{parts[1]}-{parts[2]}"
+
+    def add(self, path):
+        date_str = self.date_of(path)
+        if date_str is None or not os.path.isfile(path):
+            return
+
+        st = os.stat(path)
+        name = os.path.basename(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (path, date_str, name, st.st_size, st.st_mtime, self.classify(name))
+            )
+
+    def remove(self, path):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def load(self, since=None):
+        cache = {}
+        query = "SELECT date_str, path FROM files"
+        args = ()
+        if since is not None:
+            query += " WHERE date_str >= ?"
+            args = (since.strftime("%Y-%m-%d"),)
+
+        with self.lock:
+            rows = self.conn.execute(query, args).fetchall()
+
+        for date_str, path in rows:
+            cache.setdefault(date_str, []).append(path)
+        return cache
+
+    def find(self, keyword, since=None):
+        query = "SELECT date_str, path FROM files WHERE instr(py_lower(name), ?) > 0"
+        args = (keyword,)
+        if since is not None:
+            query += " AND date_str >= ?"
+            args += (since.strftime("%Y-%m-%d"),)
+
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY date_str DESC, path", args).fetchall()
+
+        found = {}
+        for date_str, path in rows:
+            found.setdefault(date_str, []).append(path)
+        return found
+
+    def all_files(self):
+        with self.lock:
+            return self.conn.execute("SELECT path, date_str, name FROM files").fetchall()
+
+    def files_of_type(self, typ):
+        with self.lock:
+            return self.conn.execute("SELECT path, mtime FROM files WHERE type = ?", (typ,)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class NameIndex:
+    TOKEN_PATTERN = re.compile(rf'[{CJK_CLASS}]+|(?:(?![{CJK_CLASS}])[^\W_])+')
+    CJK_PATTERN = re.compile(rf'[{CJK_CLASS}]')
+    BROAD_POSTINGS = 4096
+
+    def __init__(self, min_score=0.5):
+        self.min_score = min_score
+        self.lock = threading.Lock()
+        self.ready = False
+        self._ids = {}
+        self._docs = {}
+        self._postings = {}
+        self._recent = []
+        self._names = None
+        self._next_id = 0
+
+    @classmethod
+    def grams(cls, text):
+        grams = set()
+        for token in cls.TOKEN_PATTERN.findall(text.lower()):
+            if cls.CJK_PATTERN.match(token):
+                grams.update(token[i:i + 2] for i in range(len(token) - 1) or [0])
+
+            else:
+                padded = f" {token} "
+                grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    def _add(self, path, date_str, bulk=False):
+        if path in self._ids:
+            return False
+
+        name = os.path.basename(path).lower()
+        grams = self.grams(name)
+        doc = self._next_id
+        day = -int(date_str.replace("-", ""))
+        self._next_id += 1
+        self._ids[path] = doc
+        self._docs[doc] = (path, date_str, name, len(grams), day)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(doc)
+        if not bulk:
+            bisect.insort(self._recent, (day, path, name))
+            self._names = None
+        return True
+
+    def _remove(self, path, bulk=False):
+        doc = self._ids.pop(path, None)
+        if doc is None:
+            return False
+
+        _, _, name, _, day = self._docs.pop(doc)
+        if not bulk:
+            del self._recent[bisect.bisect_left(self._recent, (day, path, name))]
+            self._names = None
+        for gram in self.grams(name):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(doc)
+                if not posting:
+                    del self._postings[gram]
+        return True
+
+    def add(self, path, date_str):
+        with self.lock:
+            self._add(path, date_str)
+
+    def remove(self, path):
+        with self.lock:
+            self._remove(path)
+
+    def sync(self, rows):
+        current = {path: date_str for path, date_str, _ in rows}
+        with self.lock:
+            changed = False
+            for path in [p for p in self._ids if p not in current]:
+                changed = self._remove(path, bulk=True) or changed
+            for path, date_str in current.items():
+                changed = self._add(path, date_str, bulk=True) or changed
+            if changed:
+                self._recent = sorted((day, path, name) for path, _, name, _, day in self._docs.values())
+                self._names = None
+            self.ready = True
+
+    @staticmethod
+    def _distance(keyword, name):
+        prev2, prev = None, [0] * (len(name) + 1)
+        for i in range(1, len(keyword) + 1):
+            cur = [i] + [0] * len(name)
+            for j in range(1, len(name) + 1):
+                cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (keyword[i - 1] != name[j - 1]))
+                if i > 1 and j > 1 and keyword[i - 1] == name[j - 2] and keyword[i - 2] == name[j - 1]:
+                    cur[j] = min(cur[j], prev2[j - 2] + 1)
+            prev2, prev = prev, cur
+        return min(prev)
+
+    def _scan(self, keyword, limit):
+        if self._names is None:
+            self._names = "".join([f"{name}\0" for _, _, name in self._recent])
+
+        names = self._names
+        found = []
+        line, pos = 0, 0
+        i = names.find(keyword)
+        while i >= 0 and len(found) < limit:
+            line += names.count("\0", pos, i)
+            found.append(self._docs[self._ids[self._recent[line][1]]])
+            line, pos = line + 1, names.find("\0", i) + 1
+            i = names.find(keyword, pos)
+        return found
+
+    def search(self, keyword, limit=500):
+        keyword = keyword.lower().strip()
+        qgrams = self.grams(keyword)
+        if not qgrams:
+            return []
+
+        with self.lock:
+            if len(keyword) == 1 or len(keyword) == 2 and not self.CJK_PATTERN.search(keyword):
+                return [(path, date_str) for path, date_str, _, _, _ in self._scan(keyword, limit)]
+
+            postings = sorted((self._postings.get(gram, ()) for gram in qgrams), key=len)
+            if len(postings[0]) > self.BROAD_POSTINGS:
+                found = self._scan(keyword, limit)
+                if len(found) == limit:
+                    return [(path, date_str) for path, date_str, _, _, _ in found]
+
+            strict = max(1, math.ceil(len(qgrams) * self.min_score))
+            edits = (len(keyword) + 1) // 5
+            need = max(1, min(strict, len(qgrams) - 4 * edits))
+            rare = sum(1 for posting in postings if len(posting) <= self.BROAD_POSTINGS)
+            full = len(postings) - need + 1
+            for prefix in dict.fromkeys((min(rare, full) or full, full)):
+                counts = Counter()
+                for posting in postings[:prefix]:
+                    counts.update(posting)
+                for posting in postings[prefix:]:
+                    counts.update(counts.keys() & posting)
+                ranked = []
+                for doc, shared in counts.most_common(limit * 4):
+                    if shared < need or shared < strict and len(ranked) >= limit:
+                        break
+
+                    path, date_str, name, size, day = self._docs[doc]
+                    if shared < strict and self._distance(keyword, name) > edits:
+                        continue
+
+                    score = shared / len(qgrams) + 0.1 * shared / (len(qgrams) + size - shared)
+                    ranked.append((-score - (keyword in name), day, path, date_str))
+                if ranked or not edits:
+                    break
+
+        return [(path, date_str) for _, _, path, date_str in heapq.nsmallest(limit, ranked)]
+
+
+class TextIndex:
+    MAX_FILE_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, root):
+        self.lock = threading.Lock()
+        meta_dir = os.path.join(root, META_DIR)
+        os.makedirs(meta_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(meta_dir, "fulltext.db"), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS docs (path TEXT PRIMARY KEY, mtime REAL NOT NULL)")
+            try:
+                self.conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS lines "
+                    "USING fts5(path UNINDEXED, lineno UNINDEXED, body, tokenize='trigram')"
+                )
+
+            except sqlite3.OperationalError:
+                self.conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(path UNINDEXED, lineno UNINDEXED, body)"
+                )
+
+    @classmethod
+    def read_text(cls, fp):
+        with open_path(fp) as f:
+            return cls.decode(f.read())
+
+    @staticmethod
+    def decode(raw):
+        for enc in TEXT_ENCODINGS:
+            try:
+                return raw.decode(enc)
+
+            except UnicodeDecodeError:
+                continue
+        return raw.decode("utf-8", errors="replace")
+
+    def index_file(self, fp):
+        try:
+            st = stat_path(fp)
+
+        except (OSError, KeyError):
+            self.remove(fp)
+            return
+
+        rows = []
+        if st.st_size <= self.MAX_FILE_SIZE:
+            for lineno, line in enumerate(self.read_text(fp).splitlines(), 1):
+                line = line.strip()
+                if line:
+                    rows.append((fp, lineno, line))
+
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM lines WHERE path = ?", (fp,))
+            self.conn.executemany("INSERT INTO lines (path, lineno, body) VALUES (?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO docs VALUES (?, ?)", (fp, st.st_mtime))
+
+    def remove(self, fp):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM lines WHERE path = ?", (fp,))
+            self.conn.execute("DELETE FROM docs WHERE path = ?", (fp,))
+
+    def sync(self, files, cancelled=lambda: False):
+        with self.lock:
+            known = dict(self.conn.execute("SELECT path, mtime FROM docs"))
+
+        current = dict(files)
+        for fp in known.keys() - current.keys():
+            self.remove(fp)
+
+        for fp, mtime in current.items():
+            if cancelled():
+                return
+
+            if known.get(fp) != mtime:
+                self.index_file(fp)
+
+    def search(self, keyword, limit=200):
+        if len(keyword) >= 3:
+            sql = (
+                "SELECT path, lineno, snippet(lines, 2, '[', ']', '...', 16), bm25(lines) "
+                "FROM lines WHERE lines MATCH ? ORDER BY rank LIMIT ?"
+            )
+            args = ('"' + keyword.replace('"', '""') + '"', limit)
+
+        else:
+            sql = "SELECT path, lineno, body, 0 FROM lines WHERE body LIKE ? ESCAPE '\\' LIMIT ?"
+            escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            args = (f"%{escaped}%", limit)
+
+        with self.lock:
+            try:
+                rows = self.conn.execute(sql, args).fetchall()
+
+            except sqlite3.OperationalError:
+                return []
+
+        hits = {}
+        for fp, lineno, snippet, score in rows:
+            entry = hits.setdefault(fp, [0.0, []])
+            entry[0] += score - 1
+            entry[1].append((lineno, snippet))
+        return [(fp, sorted(lines)) for fp, (_, lines) in sorted(hits.items(), key=lambda kv: kv[1][0])]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class TextPager:
+    SAMPLE_SIZE = 64 * 1024
+    PAGE_SIZE = 256 * 1024
+    LOOKAHEAD_SIZE = 64 * 1024
+
+    def __init__(self, fp, offset=0, encoding=None):
+        self.fp = fp
+        self.offset = offset
+        if split_pack_path(fp):
+            self._file = None
+            self._map = packs.read(fp)
+            self.size = len(self._map)
+
+        else:
+            self._file = open(fp, "rb")
+            self.size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.encoding = encoding or self.detect_encoding(self._map[:self.SAMPLE_SIZE])
+        if self.encoding == "utf-8-sig" and not self.offset:
+            self.offset = len(codecs.BOM_UTF8)
+
+    @staticmethod
+    def detect_encoding(sample):
+        if sample.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+
+        cut = sample.rfind(b"\n")
+        if cut > 0:
+            sample = sample[:cut]
+
+        for enc in TEXT_ENCODINGS:
+            try:
+                sample.decode(enc)
+                return enc
+
+            except UnicodeDecodeError as e:
+                if enc == "utf-8" and e.start >= len(sample) - 3 and e.reason == "unexpected end of data":
+                    return enc
+        return "utf-8"
+
+    @property
+    def at_end(self):
+        return self.offset >= self.size
+
+    def next_page(self):
+        if self.at_end:
+            return ""
+
+        encoding = self.encoding.replace("-sig", "")
+        end = min(self.offset + self.PAGE_SIZE, self.size)
+        if end < self.size:
+            newline = self._map.find(b"\n", end, end + self.LOOKAHEAD_SIZE)
+            if newline < 0:
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                text = decoder.decode(self._map[self.offset:end])
+                self.offset = end - len(decoder.getstate()[0])
+                if text.endswith("\r"):
+                    text = text[:-1]
+                    self.offset -= 1
+                return text.replace("\r\n", "\n")
+            end = newline + 1
+
+        chunk = self._map[self.offset:end]
+        self.offset = end
+        return chunk.decode(encoding, errors="replace").replace("\r\n", "\n")
+
+    def close(self):
+        if self._file is None:
+            self._map = b""
+            return
+
+        try:
+            if self.size:
+                self._map.close()
+
+        finally:
+            self._file.close()
+
+
+class SyntaxHighlighter:
+    STRING = r'"(?:[^"\\]|\\.)*"?|\'(?:[^\'\\]|\\.)*\'?'
+    NUMBER = r'\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\b'
+    C_KEYWORDS = (
+        "auto break case catch char class const continue default defer delete do double else enum export "
+        "extends extern false final float for func function go if implements import include interface int "
+        "let long namespace new nil null package private protected public return select short static struct "
+        "super switch template this throw true try type typedef union unsigned var void volatile while"
+    )
+    PY_KEYWORDS = (
+        "False None True and as assert async await break class continue def del elif else except finally "
+        "for from global if import in is lambda nonlocal not or pass raise return self try while with yield"
+    )
+    LANGUAGES = {
+        "python": [
+            ("comment", r'#.*'),
+            ("string", r'[rbfRBF]{0,2}(?:"""[^\n]*?(?:"""|$)|\'\'\'[^\n]*?(?:\'\'\'|$)|' + STRING + ')'),
+            ("name", r'(?<=\bdef )\w+|(?<=\bclass )\w+|@[\w.]+'),
+            ("keyword", r'\b(?:' + "|".join(PY_KEYWORDS.split()) + r')\b'),
+            ("number", NUMBER)
+        ],
+        "c": [
+            ("comment", r'//.*|/\*.*?(?:\*/|$)'),
+            ("string", STRING + r'|`[^`]*`?'),
+            ("name", r'^\s*#\s*\w+'),
+            ("keyword", r'\b(?:' + "|".join(C_KEYWORDS.split()) + r')\b'),
+            ("number", NUMBER)
+        ],
+        "json": [
+            ("key", r'"(?:[^"\\]|\\.)*"(?=\s*:)'),
+            ("string", r'"(?:[^"\\]|\\.)*"?'),
+            ("keyword", r'\b(?:true|false|null)\b'),
+            ("number", r'-?' + NUMBER)
+        ],
+        "config": [
+            ("comment", r'^\s*[#;].*|\s#.*'),
+            ("name", r'^\s*\[[^\]]*\]'),
+            ("key", r'^\s*-?\s*[\w.\-]+(?=\s*[:=])'),
+            ("string", STRING),
+            ("keyword", r'\b(?:true|false|yes|no|on|off|null)\b'),
+            ("number", NUMBER)
+        ],
+        "markup": [
+            ("comment", r'<!--.*?(?:-->|$)'),
+            ("keyword", r'</?[\w:\-]+|/?>'),
+            ("key", r'\b[\w:\-]+(?==)'),
+            ("string", STRING)
+        ],
+        "shell": [
+            ("comment", r'(?:^|\s)#.*|^\s*(?:@?rem\b|::).*'),
+            ("string", STRING),
+            ("name", r'\$\{?\w+\}?|%\w+%'),
+            ("keyword", r'\b(?:if|then|else|elif|fi|for|do|done|while|case|esac|function|echo|set|goto|call|exit)\b'),
+            ("number", NUMBER)
+        ],
+        "markdown": [
+            ("keyword", r'^#{1,6}\s.*'),
+            ("string", r'`[^`]*`'),
+            ("name", r'\*\*[^*]+\*\*|\[[^\]]+\]\([^)]*\)'),
+            ("comment", r'^\s*>.*')
+        ]
+    }
+    EXTENSIONS = {
+        ".py": "python",
+        ".c": "c", ".cpp": "c", ".h": "c", ".hpp": "c", ".java": "c", ".go": "c",
+        ".js": "c", ".ts": "c", ".php": "c", ".css": "c",
+        ".json": "json",
+        ".ini": "config", ".conf": "config", ".yaml": "config", ".yml": "config",
+        ".html": "markup", ".htm": "markup", ".xml": "markup",
+        ".sh": "shell", ".bat": "shell",
+        ".md": "markdown"
+    }
+    _compiled = {}
+
+    @classmethod
+    def language_for(cls, fp):
+        return cls.EXTENSIONS.get(os.path.splitext(fp or "")[-1].lower())
+
+    @classmethod
+    def pattern(cls, lang):
+        pattern = cls._compiled.get(lang)
+        if pattern is None:
+            pattern = cls._compiled[lang] = re.compile(
+                "|".join(f"(?P<{tag}>{regex})" for tag, regex in cls.LANGUAGES[lang]), re.MULTILINE
+            )
+        return pattern
+
+    @classmethod
+    def highlight(cls, lang, text, first_line):
+        pattern = cls.pattern(lang)
+        spans = {}
+        for lineno, line in enumerate(text.split("\n"), first_line):
+            for m in pattern.finditer(line):
+                if m.end() > m.start():
+                    spans.setdefault(m.lastgroup, []).extend((f"{lineno}.{m.start()}", f"{lineno}.{m.end()}"))
+        return spans
+
+
+class NoteJournal:
+    HEADER = struct.Struct("<4sQq")
+    RECORD = struct.Struct("<qQI")
+    MAGIC = b"QNI1"
+    STAMP_PATTERN = re.compile(rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})$')
+    SUMMARY_BYTES = 256
+
+    def __init__(self, root):
+        self.root = root
+        self.index_dir = os.path.join(root, META_DIR, "notes")
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def parse_range(spec, today=None):
+        today = today or date.today()
+        if not spec:
+            return today - timedelta(days=30), today
+
+        def bounds(token):
+            parts = [int(p) for p in token.split("-")]
+            if len(parts) == 1:
+                return date(parts[0], 1, 1), date(parts[0], 12, 31)
+
+            if len(parts) == 2:
+                first = date(parts[0], parts[1], 1)
+                return first, date(first.year + first.month // 12, first.month % 12 + 1, 1) - timedelta(days=1)
+            day = date(*parts)
+            return day, day
+
+        first, _, last = spec.partition("..")
+        start, end = bounds(first.strip())
+        if last.strip():
+            end = bounds(last.strip())[1]
+        return start, min(end, today)
+
+    def note_path(self, day):
+        name = f"{day:%Y%m%d}.txt"
+        loose = os.path.join(self.root, f"{day:%Y}", f"{day:%m}", f"{day:%d}", name)
+        if os.path.isfile(loose):
+            return loose
+
+        packed = os.path.join(self.root, f"{day:%Y}", f"{day:%m}.zip", f"{day:%d}", name)
+        if os.path.isfile(os.path.dirname(os.path.dirname(packed))) and packs.exists(packed):
+            return packed
+        return None
+
+    def _index_path(self, fp):
+        rel = os.path.relpath(os.path.abspath(fp), os.path.abspath(self.root)).replace(os.sep, "/")
+        digest = hashlib.sha1(rel.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.index_dir, f"{os.path.splitext(os.path.basename(fp))[0]}-{digest}.idx")
+
+    def _load(self, fp):
+        try:
+            with open(self._index_path(fp), "rb") as f:
+                data = f.read()
+
+        except OSError:
+            return None
+
+        if len(data) < self.HEADER.size:
+            return None
+        magic, size, mtime_ns = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or (len(data) - self.HEADER.size) % self.RECORD.size:
+            return None
+        return size, mtime_ns, list(self.RECORD.iter_unpack(data[self.HEADER.size:]))
+
+    def _save(self, fp, size, mtime_ns, records):
+        path = self._index_path(fp)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, size, mtime_ns))
+            f.write(b"".join(self.RECORD.pack(*r) for r in records))
+        os.replace(tmp_path, path)
+
+    def _parse(self, data, base=0):
+        starts = []
+        pos = 0
+        prev_blank = True
+        for line in data.splitlines(keepends=True):
+            m = self.STAMP_PATTERN.match(line.rstrip(b"\r\n"))
+            if m and prev_blank:
+                starts.append((pos, m.group(1).decode("ascii")))
+            prev_blank = not line.strip()
+            pos += len(line)
+
+        records = []
+        for i, (start, stamp) in enumerate(starts):
+            end = starts[i + 1][0] if i + 1 < len(starts) else len(data)
+            when = datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S")
+            records.append((int(when.timestamp()), base + start, end - start))
+        return records
+
+    def entries(self, fp):
+        st = stat_path(fp)
+        with self.lock:
+            cached = self._load(fp)
+            if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+                return cached[2]
+
+            records = None
+            if cached is not None and cached[0] < st.st_size and split_pack_path(fp) is None:
+                with open(fp, "rb") as f:
+                    f.seek(cached[0])
+                    tail = f.read()
+                if self.STAMP_PATTERN.match(tail.split(b"\n", 1)[0].rstrip(b"\r")):
+                    records = cached[2] + self._parse(tail, cached[0])
+
+            if records is None:
+                with open_path(fp) as f:
+                    records = self._parse(f.read())
+            self._save(fp, st.st_size, st.st_mtime_ns, records)
+            return records
+
+    def append(self, fp, text, when=None):
+        when = when or datetime.now()
+        body = f"{when:%Y-%m-%d %H:%M:%S}\n{text}\n\n".replace("\n", os.linesep)
+        data = body.encode("utf-8")
+        with self.lock:
+            cached = self._load(fp)
+            with open(fp, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+            st = os.stat(fp)
+
+            if cached is not None and cached[0] == offset:
+                path = self._index_path(fp)
+                with open(path, "r+b") as f:
+                    f.write(self.HEADER.pack(self.MAGIC, st.st_size, st.st_mtime_ns))
+                    f.seek(0, os.SEEK_END)
+                    f.write(self.RECORD.pack(int(when.timestamp()), offset, len(data)))
+
+            elif offset == 0:
+                self._save(fp, st.st_size, st.st_mtime_ns, [(int(when.timestamp()), 0, len(data))])
+        return offset
+
+    def read_entry(self, fp, offset, length):
+        with open_path(fp) as f:
+            f.seek(offset)
+            raw = f.read(length)
+        return TextIndex.decode(raw).strip()
+
+    def has_preamble(self, fp, offset):
+        with open_path(fp) as f:
+            while offset > 0:
+                chunk = f.read(min(offset, 65536))
+                if not chunk:
+                    break
+
+                if chunk.strip():
+                    return True
+                offset -= len(chunk)
+        return False
+
+    def list_entries(self, fp):
+        items = []
+        records = self.entries(fp)
+        with open_path(fp) as f:
+            for stamp, offset, length in records:
+                f.seek(offset)
+                head = TextIndex.decode(f.read(min(length, self.SUMMARY_BYTES))).strip().splitlines()
+                summary = next((line.strip() for line in head[1:] if line.strip()), "")
+                items.append((fp, datetime.fromtimestamp(stamp), offset, length, summary))
+        return items
+
+    def list_range(self, start, end, cancelled=lambda: False):
+        items = []
+        day = start
+        while day <= end and not cancelled():
+            fp = self.note_path(day)
+            if fp is not None:
+                items += self.list_entries(fp)
+            day += timedelta(days=1)
+        return items
+
+
+class LogWriter:
+    FIELD_UNITS = {"size": "KB"}
+
+    def __init__(self, root, on_error, flush_interval=0.5, fsync="batch", fmt="text", max_batch=1000, metrics=None):
+        self.root = root
+        self.on_error = on_error
+        self.metrics = metrics
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fmt = fmt
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self._files = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def path_for(self, year):
+        return os.path.join(self.root, year, f"{year}.log")
+
+    def write(self, label, fields, when=None):
+        self.queue.put((when or datetime.now(), label, fields))
+
+    def format_line(self, when, label, fields):
+        now_str = when.strftime("%Y-%m-%d %H:%M:%S")
+        if self.fmt == "jsonl":
+            return json.dumps({"time": now_str, "type": label, **fields}, ensure_ascii=False) + "\n"
+
+        parts = [f"time: {now_str}", f"type: {label}"]
+        parts += [f"{k}: {v}{self.FIELD_UNITS.get(k, '')}" for k, v in fields.items()]
+        return ", ".join(parts) + "\n"
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    item = self.queue.get(timeout=remaining)
+
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+
+            if stop:
+                break
+
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _open(self, year):
+        f = self._files.get(year)
+        if f is None:
+            for old in self._files.values():
+                old.close()
+            self._files.clear()
+            path = self.path_for(year)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = self._files[year] = open(path, "a", encoding="utf-8")
+        return f
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        try:
+            for when, label, fields in batch:
+                f = self._open(when.strftime("%Y"))
+                f.write(self.format_line(when, label, fields))
+                if self.fsync == "always":
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            for f in self._files.values():
+                f.flush()
+                if self.fsync == "batch":
+                    os.fsync(f.fileno())
+
+        except Exception:
+            self.on_error("LogWriter commit exception:\n" + traceback.format_exc())
+
+        if self.metrics is not None:
+            self.metrics.record("log_commit", time.perf_counter() - start)
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class LogReader:
+    BLOCK_SIZE = 64 * 1024
+    LINE_PATTERN = re.compile(rb"^time: (\d{4}-\d{2}-\d{2})[^,]*, type: (\w+)")
+    JSON_PATTERN = re.compile(rb'^\{"time": "(\d{4}-\d{2}-\d{2})[^"]*", "type": "(\w+)"')
+
+    def __init__(self, path, index_path):
+        self.path = path
+        self.index_path = index_path
+
+    @classmethod
+    def parse(cls, line):
+        m = cls.JSON_PATTERN.match(line) if line.startswith(b"{") else cls.LINE_PATTERN.match(line)
+        if not m:
+            return None, None
+        return m.group(1).decode(), m.group(2).decode()
+
+    def iter_reverse(self, end=None, start=0):
+        with open(self.path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END) if end is None else end
+            tail = b""
+            while pos > start:
+                size = min(self.BLOCK_SIZE, pos - start)
+                pos -= size
+                f.seek(pos)
+                lines = (f.read(size) + tail).split(b"\n")
+                offsets = []
+                offset = pos
+                for line in lines:
+                    offsets.append(offset)
+                    offset += len(line) + 1
+
+                first = 1 if pos > start else 0
+                for i in range(len(lines) - 1, first - 1, -1):
+                    if lines[i].strip():
+                        yield offsets[i], lines[i]
+                tail = lines[0]
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+
+        except (OSError, ValueError):
+            index = {"size": 0, "days": {}}
+
+        size = os.path.getsize(self.path)
+        if size < index["size"]:
+            index = {"size": 0, "days": {}}
+
+        if size > index["size"]:
+            offset = index["size"]
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    day, typ = self.parse(line)
+
+                    if day:
+                        entry = index["days"].setdefault(day, [offset, offset, {}])
+                        entry[0] = min(entry[0], offset)
+                        entry[1] = max(entry[1], offset + len(line))
+                        entry[2][typ] = entry[2].get(typ, 0) + 1
+                    offset += len(line)
+
+            index["size"] = offset
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+
+        return index
+
+    def query(self, types=None, day_prefix=""):
+        ranges = sorted(
+            (start, end) for day, (start, end, counts) in self.load_index()["days"].items()
+            if day.startswith(day_prefix) and (not types or any(counts.get(t) for t in types))
+        )
+
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+
+            else:
+                merged.append([start, end])
+
+        for start, end in reversed(merged):
+            for _, line in self.iter_reverse(end, start):
+                day, typ = self.parse(line)
+                if day and day.startswith(day_prefix) and (not types or typ in types):
+                    yield line
+
+
+class LogPager:
+    PAGE_ENTRIES = 200
+
+    def __init__(self, reader, formatter, types=None, day_prefix=""):
+        self.formatter = formatter
+        if types or day_prefix:
+            self._lines = reader.query(types, day_prefix)
+
+        else:
+            self._lines = (line for _, line in reader.iter_reverse())
+        self.at_end = False
+
+    def next_page(self):
+        res = []
+        for line in self._lines:
+            res.append(f"{self.formatter(line.decode('utf-8', errors='replace').strip())}\n\n")
+            if len(res) >= self.PAGE_ENTRIES:
+                return "".join(res)
+
+        self.at_end = True
+        return "".join(res)
+
+    def close(self):
+        self._lines.close()
+
+
+class ArchiveWatcher:
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, root, callback, interval=2.0):
+        self.root = root
+        self.callback = callback
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._libc = None
+        self._fd = -1
+        self._watches = {}
+        self.mode = None
+
+    def start(self):
+        if sys.platform.startswith("linux") and self._init_inotify():
+            self.mode = "inotify"
+            target = self._inotify_loop
+
+        else:
+            self.mode = "polling"
+            target = self._poll_loop
+
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _depth(self, path):
+        rel = os.path.relpath(path, self.root)
+        return 0 if rel == "." else len(rel.split(os.sep))
+
+    def _is_archive_file(self, path):
+        parts = os.path.relpath(path, self.root).split(os.sep)
+        return (
+            len(parts) == 4
+            and all(p.isdigit() and len(p) == n for p, n in zip(parts[:3], (4, 2, 2)))
+            and not parts[3].endswith(".log")
+        )
+
+    def _emit(self, event, path, dest=None):
+        try:
+            self.callback(event, path, dest)
+
+        except Exception:
+            pass
+
+    def _init_inotify(self):
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self._fd = self._libc.inotify_init1(os.O_NONBLOCK)
+            if self._fd < 0:
+                return False
+            os.makedirs(self.root, exist_ok=True)
+            self._add_tree(self.root, announce=False)
+            return True
+
+        except Exception:
+            return False
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = path
+
+    def _add_tree(self, path, announce=True):
+        depth = self._depth(path)
+        if depth > 3:
+            return
+        self._add_watch(path)
+
+        try:
+            entries = list(os.scandir(path))
+
+        except OSError:
+            return
+
+        for entry in entries:
+            if depth < 3 and entry.name.isdigit() and entry.is_dir():
+                self._add_tree(entry.path, announce)
+
+            elif depth == 3 and announce and entry.is_file() and self._is_archive_file(entry.path):
+                self._emit("created", entry.path)
+
+    def _inotify_loop(self):
+        moves = {}
+        try:
+            while not self._stop_event.is_set():
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if not ready:
+                    for path in moves.values():
+                        self._emit("deleted", path)
+                    moves.clear()
+                    continue
+
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+
+                except BlockingIOError:
+                    continue
+
+                offset = 0
+                while offset < len(data):
+                    wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+                    offset += self.EVENT_HEADER.size
+                    name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                    offset += length
+                    self._handle_event(wd, mask, cookie, name, moves)
+
+        finally:
+            os.close(self._fd)
+
+    def _handle_event(self, wd, mask, cookie, name, moves):
+        if mask & self.IN_Q_OVERFLOW:
+            self._emit("rescan", self.root)
+            return
+
+        if mask & (self.IN_IGNORED | self.IN_DELETE_SELF):
+            self._watches.pop(wd, None)
+            return
+
+        parent = self._watches.get(wd)
+        if parent is None or not name:
+            return
+        path = os.path.join(parent, name)
+
+        if mask & self.IN_ISDIR:
+            if mask & (self.IN_CREATE | self.IN_MOVED_TO) and name.isdigit():
+                self._add_tree(path)
+
+            elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                self._emit("rescan", path)
+            return
+
+        if not self._is_archive_file(path):
+            if mask & self.IN_MOVED_TO and cookie in moves:
+                self._emit("deleted", moves.pop(cookie))
+            return
+
+        if mask & self.IN_MOVED_FROM:
+            moves[cookie] = path
+
+        elif mask & self.IN_MOVED_TO:
+            src = moves.pop(cookie, None)
+            if src is None:
+                self._emit("created", path)
+
+            else:
+                self._emit("moved", src, path)
+
+        elif mask & self.IN_CLOSE_WRITE:
+            self._emit("created", path)
+
+        elif mask & self.IN_DELETE:
+            self._emit("deleted", path)
+
+    def _snapshot(self):
+        days = {}
+        if not os.path.isdir(self.root):
+            return days
+
+        for year in os.scandir(self.root):
+            if not (year.name.isdigit() and len(year.name) == 4 and year.is_dir()):
+                continue
+
+            for month in os.scandir(year.path):
+                if not (month.name.isdigit() and len(month.name) == 2 and month.is_dir()):
+                    continue
+
+                for day in os.scandir(month.path):
+                    if day.name.isdigit() and len(day.name) == 2 and day.is_dir():
+                        days[day.path] = day.stat().st_mtime_ns
+        return days
+
+    def _list_files(self, day_path):
+        try:
+            return {
+                e.name for e in os.scandir(day_path)
+                if e.is_file() and not e.name.endswith(".log")
+            }
+
+        except OSError:
+            return set()
+
+    def _poll_loop(self):
+        known = {}
+        try:
+            known = {p: (-1, self._list_files(p)) for p in self._snapshot()}
+
+        except OSError:
+            pass
+
+        while not self._stop_event.wait(self.interval):
+            try:
+                current = self._snapshot()
+
+            except OSError:
+                continue
+
+            for day_path in set(known) - set(current):
+                for name in known.pop(day_path)[1]:
+                    self._emit("deleted", os.path.join(day_path, name))
+
+            for day_path, mtime_ns in current.items():
+                old_mtime, old_names = known.get(day_path, (None, set()))
+                if old_mtime == mtime_ns:
+                    continue
+                names = self._list_files(day_path)
+                known[day_path] = (mtime_ns if time.time_ns() - mtime_ns >= MTIME_SETTLE_NS else -1, names)
+
+                for name in sorted(old_names - names):
+                    self._emit("deleted", os.path.join(day_path, name))
+                for name in sorted(names - old_names):
+                    self._emit("created", os.path.join(day_path, name))
+
+
+class BulkImporter:
+    MAX_IN_FLIGHT = 256
+
+    def __init__(self, root, log_writer, workers=8, fixed_date=None, on_progress=print):
+        self.root = root
+        self.log_writer = log_writer
+        self.workers = workers
+        self.fixed_date = fixed_date
+        self.on_progress = on_progress
+        self.state_dir = os.path.join(root, META_DIR, "imports")
+        self.tmp_dir = os.path.join(self.state_dir, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self._allocators = {}
+        self._done = set()
+        self._journal = None
+        self._resuming = False
+        self.stats = {"copied": 0, "skipped": 0, "failed": 0, "bytes": 0}
+
+    def _allocator(self, day_dir):
+        with self.lock:
+            allocator = self._allocators.get(day_dir)
+            if allocator is None:
+                os.makedirs(day_dir, exist_ok=True)
+                allocator = self._allocators[day_dir] = NameAllocator(day_dir)
+            return allocator
+
+    def _day_dir(self, src):
+        day = self.fixed_date or datetime.fromtimestamp(os.path.getmtime(src))
+        return os.path.join(self.root, day.strftime("%Y"), day.strftime("%m"), day.strftime("%d"))
+
+    def _iter_sources(self, sources):
+        archive_root = os.path.abspath(self.root)
+        for source in sources:
+            if os.path.isfile(source):
+                yield os.path.abspath(source)
+                continue
+
+            for dirpath, dirnames, filenames in os.walk(source):
+                dirnames[:] = sorted(
+                    d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) != archive_root
+                )
+                for name in sorted(filenames):
+                    yield os.path.abspath(os.path.join(dirpath, name))
+
+    def _load_journal(self, sources):
+        key = "|".join(sorted(os.path.abspath(s) for s in sources))
+        key += f"|{self.fixed_date:%Y%m%d}" if self.fixed_date else "|mtime"
+        path = os.path.join(self.state_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".journal")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._done = {line.rstrip("\n") for line in f if line.endswith("\n")}
+            self._resuming = True
+        self._journal = open(path, "a", encoding="utf-8")
+
+    def _record(self, src, stat, size=0):
+        with self.lock:
+            self._journal.write(src + "\n")
+            self._journal.flush()
+            self.stats[stat] += 1
+            self.stats["bytes"] += size
+
+    @staticmethod
+    def _same_file(src, target):
+        try:
+            a, b = os.stat(src), os.stat(target)
+            return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+        except OSError:
+            return False
+
+    def _import_one(self, src):
+        try:
+            fname = os.path.basename(src)
+            size = os.path.getsize(src)
+            is_text_log = bool(DAILY_NOTE_PATTERN.match(fname))
+            day_dir = self._day_dir(src)
+            if self._resuming and self._same_file(src, os.path.join(day_dir, fname)):
+                self._record(src, "skipped")
+                return
+
+            target = self._allocator(day_dir).allocate(fname, is_text_log)
+            tmp_path = os.path.join(self.tmp_dir, f"{threading.get_ident()}-{time.monotonic_ns()}")
+            try:
+                fast_copy(src, tmp_path)
+                os.replace(tmp_path, target)
+
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            self.log_writer.write("FILE_UPLOAD", {"filename": os.path.basename(target), "size": round(size / 1024, 2)})
+            self._record(src, "copied", size)
+
+        except Exception:
+            with self.lock:
+                self.stats["failed"] += 1
+            self.on_progress(f"Import failed: {src}\n{traceback.format_exc()}")
+
+    def run(self, sources):
+        self._load_journal(sources)
+        slots = threading.BoundedSemaphore(self.MAX_IN_FLIGHT)
+        start = time.monotonic()
+        last_report = start
+
+        def release(_):
+            slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for src in self._iter_sources(sources):
+                    if src in self._done:
+                        with self.lock:
+                            self.stats["skipped"] += 1
+                        continue
+
+                    slots.acquire()
+                    pool.submit(self._import_one, src).add_done_callback(release)
+
+                    now = time.monotonic()
+                    if now - last_report >= 2:
+                        last_report = now
+                        self.on_progress(self._summary(now - start))
+
+        finally:
+            self._journal.close()
+            self.log_writer.flush()
+
+        self.on_progress(self._summary(time.monotonic() - start))
+        return self.stats
+
+    def _summary(self, elapsed):
+        rate = self.stats["bytes"] / max(elapsed, 1e-6) / (1024 * 1024)
+        return (
+            f"copied {self.stats['copied']}, skipped {self.stats['skipped']}, "
+            f"failed {self.stats['failed']}, {rate:.1f} MB/s"
+        )
+
+
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="QuanLog", description="Import files into the YYYY/MM/DD archive.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="copy files or directory trees into the archive")
+    imp.add_argument("sources", nargs="+")
+    imp.add_argument("--root", default=os.getcwd(), help="archive root (default: current directory)")
+    imp.add_argument("--date", type=lambda s: datetime.strptime(s, "%Y-%m-%d"),
+                     help="archive everything under this YYYY-MM-DD instead of each file's mtime")
+    imp.add_argument("--workers", type=int, default=max(4, min(os.cpu_count() or 4, 16)))
+    imp.add_argument("--log-format", choices=("text", "jsonl"), default="text")
+    pack = sub.add_parser("pack", help="move months older than --age-days into YYYY/MM.zip cold storage")
+    pack.add_argument("--root", default=os.getcwd(), help="archive root (default: current directory)")
+    pack.add_argument("--age-days", type=int, default=180)
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        return run_pack(args.root, args.age_days)
+
+    log_writer = LogWriter(args.root, print, flush_interval=1.0, fmt=args.log_format, max_batch=10000)
+    try:
+        stats = BulkImporter(args.root, log_writer, args.workers, args.date).run(args.sources)
+
+    finally:
+        log_writer.close()
+    return 1 if stats["failed"] else 0
+
+
+def run_pack(root, age_days):
+    cold_storage = ColdStorage(root)
+    blob_store = BlobStore(root)
+    try:
+        for month_path in cold_storage.due_months(age_days):
+            pack_path, packed = cold_storage.pack_month(month_path)
+            for path in packed:
+                blob_store.release(path)
+            if packed:
+                print(f"Packed {os.path.relpath(pack_path, root)} ({len(packed)} files)")
+
+    finally:
+        blob_store.close()
+        packs.close()
+    return 0
+
+
 class QuanLog:
     def __init__(self, root):
         self.root = root
         self.root.title("QuanLog")
-        self.root.geometry("1400x700")
+        self.window_size = (1400, 700)
+        self.root.geometry("{}x{}".format(*self.window_size))
         self.root.resizable(False, False)
 
         self.selected_files = []
@@ -35,6 +2675,12 @@ class QuanLog:
         self.current_playing_video = None
         self.is_playing_video = False
         self.video_lock = threading.Lock()
+        self.video_queue_size = 4
+        self.video_late_seconds = 0.04
+        self._video_session = 0
+        self._video_pending = None
+        self._video_clock = None
+        self._video_dropped = 0
 
         now = datetime.now()
         self.date_parts = {
@@ -45,7 +2691,6 @@ class QuanLog:
         }
 
         self.current_year = self.date_parts['year']
-        self.last_year = str(int(self.current_year) - 1)
 
         self.date_path = os.path.join(
             self.current_dir,
@@ -59,11 +2704,9 @@ class QuanLog:
             f"{self.date_parts['date_str']}.txt"
         )
 
-        self.log_file_path = os.path.join(
-            self.current_dir,
-            self.date_parts['year'],
-            f"{self.date_parts['year']}.log"
-        )
+        self.log_flush_interval = 0.5
+        self.log_fsync = "batch"
+        self.log_format = "text"
 
         self.FILE_TYPES = {
             "direct_open": (
@@ -88,25 +2731,235 @@ class QuanLog:
         }
 
         self.ninety_days_ago = date.today() - timedelta(days=90)
+        self.startup_target_ms = 1000
+        self.startup_ms = None
+        self.file_index = FileIndex(self.current_dir, self._file_type)
+        self.text_index = TextIndex(self.current_dir)
+        self.name_index = NameIndex()
+        self.dedup_enabled = False
+        self.blob_store = BlobStore(self.current_dir)
+        self.thumbnail_cache = ThumbnailCache(self.current_dir)
+        self.tile_pyramid = TilePyramid(self.current_dir)
+        self.tiled_min_side = 4096
+        self._tile_view = None
+        self._tile_gen = 0
+        self._tile_rendering = False
+        self._tile_drag = None
+        self._preview_box = (480, 480)
+        self.video_thumbnailer = VideoThumbnailer(self.current_dir)
+        self.video_proxy_enabled = False
+        self.video_proxy = VideoProxyCache(self.current_dir)
+        self.preview_strip = None
+        self.preview_cache = PreviewCache()
+        self.note_journal = NoteJournal(self.current_dir)
+        self._note_title = ""
+        self._note_items = []
+        self.cold_storage = ColdStorage(self.current_dir)
+        self.cold_storage_enabled = False
+        self.cold_storage_age_days = 180
+        self.cold_storage_delay_ms = 60 * 1000
+        self.cold_storage_interval_ms = 6 * 3600 * 1000
+        self.settings_path = os.path.join(self.current_dir, META_DIR, "settings.json")
+        self.setting_labels = {
+            "dedup_enabled": "Deduplicate uploads",
+            "video_proxy_enabled": "Generate video preview proxies",
+            "cold_storage_enabled": "Pack old months into cold storage"
+        }
+        self._setting_vars = {}
+        self._cold_storage_lock = threading.Lock()
+        self._prefetching = set()
+        self.watcher = ArchiveWatcher(self.current_dir, self._on_fs_event)
+        self.rescan_delay_ms = 500
+        self._rescan_lock = threading.Lock()
+        self._rescan_pending = False
+        self.own_write_ttl = 60.0
+        self._own_writes = {}
+        self._own_writes_lock = threading.Lock()
+        self._tree_nodes = {}
+        self._date_nodes = {}
+        self._tree_cache = {}
+        self._populated_dates = set()
+        self._display_names = {}
+        self._tree_gen = 0
+        self.tree_slice_seconds = 0.015
+
+        self.search_debounce_ms = 250
+        self._search_after_id = None
+        self._search_keyword = ""
+        self._search_gen = 0
         cpu_count = os.cpu_count() or 4
         max_workers = max(4, min(cpu_count // 2, 16))
         self.thread_pool = ThreadPoolExecutor(max_workers=max_workers)
-
+        self.media_pool = ThreadPoolExecutor(max_workers=1)
+        self._name_sync_lock = threading.Lock()
+        self._text_sync_lock = threading.Lock()
+        self._video_sync_lock = threading.Lock()
+        self.video_sync_delay_ms = 5000
+        self._video_sync_scheduled = False
+        self.upload_workers = max(2, min(cpu_count, 8))
+        self._upload_lock = threading.Lock()
+        self._upload_state = {}
+
+        self.metrics = Metrics()
         self.log_queue = queue.Queue()
+        self.log_frame_ms = 50
+        self.log_burst_limit = 100
+        self.log_max_lines = 1000
+        self._log_pending = []
+        self._log_pending_lock = threading.Lock()
+        self._log_flush_scheduled = False
+        self.log_writer = LogWriter(
+            self.current_dir, self.log_queue.put,
+            flush_interval=self.log_flush_interval, fsync=self.log_fsync, fmt=self.log_format, metrics=self.metrics
+        )
+        self._text_pager = None
+        self._text_page_loading = False
+        self.highlight_block_lines = 200
+        self.highlight_margin_blocks = 1
+        self.highlight_delay_ms = 30
+        self._hl_lang = None
+        self._hl_key = None
+        self._hl_gen = 0
+        self._hl_applied = set()
+        self._hl_pending = set()
+        self._hl_after_id = None
         self._stop_event = threading.Event()
 
+        self.lag_interval_ms = 100
+        self._lag_expected = None
+        self.diagnostics_refresh_ms = 1000
+        self.diagnostics_window = None
+        self.diagnostics_tree = None
+        self._diagnostics_after_id = None
+
+        self._load_settings()
         self._init_ui()
         self._start_log_consumer()
         self.center_window()
-        self._load_files_thread()
+        self._update_file_tree(self.file_index.load(self.ninety_days_ago))
+        self._load_files_thread(only_if_changed=True)
+        self.watcher.start()
         self.file_tree.bind("<Control-c>", self.copy_selected_file_to_clipboard)
+        self.root.bind("<F12>", self.toggle_diagnostics)
+        self.root.after_idle(self._report_startup)
+        self.root.after_idle(self._monitor_event_loop)
+        self.root.after(self.cold_storage_delay_ms, self._schedule_cold_storage)
+
+    def _report_startup(self):
+        self.startup_ms = (time.perf_counter() - PROCESS_START) * 1000
+        status = "OK" if self.startup_ms <= self.startup_target_ms else "over target"
+        self.log_queue.put(f"Ready in {self.startup_ms:.0f} ms (target {self.startup_target_ms} ms, {status})")
+
+    def _monitor_event_loop(self):
+        if self._stop_event.is_set():
+            return
+
+        try:
+            now = time.perf_counter()
+            if self._lag_expected is not None:
+                self.metrics.record("event_loop_lag", max(0.0, now - self._lag_expected))
+            work_queue = getattr(self.thread_pool, "_work_queue", None)
+            if work_queue is not None:
+                self.metrics.gauge("thread_pool_queue", work_queue.qsize())
+            self.metrics.gauge("log_queue", self.log_queue.qsize())
+            self.metrics.gauge("log_writer_queue", self.log_writer.queue.qsize())
+            with self._log_pending_lock:
+                self.metrics.gauge("log_ui_pending", len(self._log_pending))
+            self._lag_expected = now + self.lag_interval_ms / 1000
+
+        except Exception:
+            self.log_queue.put("_monitor_event_loop exception:\n" + traceback.format_exc())
+
+        self.root.after(self.lag_interval_ms, self._monitor_event_loop)
+
+    def toggle_diagnostics(self, event=None):
+        try:
+            if self.diagnostics_window is None:
+                self._init_diagnostics_window()
+
+            elif self.diagnostics_window.state() == "withdrawn":
+                self.diagnostics_window.deiconify()
+                self._refresh_diagnostics()
+
+            else:
+                self.diagnostics_window.withdraw()
+
+        except Exception:
+            self.log_queue.put("toggle_diagnostics exception:\n" + traceback.format_exc())
+
+    def _init_diagnostics_window(self):
+        win = ttkbs.Toplevel(self.root)
+        win.title("QuanLog Diagnostics")
+        win.geometry("900x420")
+        win.protocol("WM_DELETE_WINDOW", win.withdraw)
+        win.bind("<F12>", self.toggle_diagnostics)
+
+        btn_frame = ttkbs.Frame(win, padding=5)
+        btn_frame.pack(fill=X, side=BOTTOM)
+        ttkbs.Button(btn_frame, text="Export", command=self.export_diagnostics, bootstyle=PRIMARY, width=12).pack(
+            side=RIGHT, padx=5
+        )
+        ttkbs.Button(btn_frame, text="Reset", command=self.metrics.reset, bootstyle=SECONDARY, width=12).pack(
+            side=RIGHT, padx=5
+        )
+
+        columns = ("count", "mean", "p50", "p90", "p99", "max", "histogram")
+        tree = ttkbs.Treeview(win, columns=columns, show="tree headings")
+        tree.heading("#0", text="Metric")
+        tree.column("#0", width=160, stretch=False)
+        for col, width in zip(columns, (60, 70, 70, 70, 70, 70, 360)):
+            tree.heading(col, text=col)
+            tree.column(col, width=width, stretch=col == "histogram", anchor=W if col == "histogram" else E)
+        tree.pack(fill=BOTH, expand=True, padx=5, pady=(5, 0))
+
+        self.diagnostics_tree = tree
+        self.diagnostics_window = win
+        self._refresh_diagnostics()
+
+    def _refresh_diagnostics(self):
+        if self._diagnostics_after_id is not None:
+            self.root.after_cancel(self._diagnostics_after_id)
+            self._diagnostics_after_id = None
+
+        win = self.diagnostics_window
+        if win is None or self._stop_event.is_set() or win.state() == "withdrawn":
+            return
+
+        try:
+            snap = self.metrics.snapshot()
+            tree = self.diagnostics_tree
+            tree.delete(*tree.get_children())
+            for name, stat in sorted(snap["timings"].items()):
+                histogram = " ".join(f"{label}:{n}" for label, n in stat["histogram"].items())
+                tree.insert("", END, text=name, values=(
+                    stat["count"], f"{stat['mean_ms']:.1f}", f"{stat['p50_ms']:.1f}", f"{stat['p90_ms']:.1f}",
+                    f"{stat['p99_ms']:.1f}", f"{stat['max_ms']:.1f}", histogram
+                ))
+            for name, stat in sorted(snap["gauges"].items()):
+                tree.insert("", END, text=name, values=(
+                    "", f"{stat['mean']:.1f}", "", "", "", stat["max"], f"current: {stat['value']}"
+                ))
+
+        except Exception:
+            self.log_queue.put("_refresh_diagnostics exception:\n" + traceback.format_exc())
+
+        self._diagnostics_after_id = self.root.after(self.diagnostics_refresh_ms, self._refresh_diagnostics)
+
+    def export_diagnostics(self):
+        path = os.path.join(
+            self.current_dir, META_DIR, "diagnostics", f"metrics-{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        try:
+            self.metrics.export(path)
+            self.log_queue.put(f"Diagnostics exported: {path}")
+
+        except Exception:
+            self.log_queue.put("export_diagnostics exception:\n" + traceback.format_exc())
 
     def center_window(self):
-        self.root.update()
         screen_w = self.root.winfo_screenwidth()
         screen_h = self.root.winfo_screenheight()
-        win_w = self.root.winfo_width()
-        win_h = self.root.winfo_height()
+        win_w, win_h = self.window_size
         x = (screen_w - win_w) // 2
         y = (screen_h - win_h) // 2
         self.root.geometry(f"+{x}+{y}")
@@ -136,6 +2989,13 @@ class QuanLog:
 
         return f"{name[:keep_chars]}...{name[-keep_chars:]}{ext}"
 
+    def _file_type(self, filename):
+        ext = os.path.splitext(filename)[-1].lower()
+        for typ, exts in self.FILE_TYPES.items():
+            if ext in exts:
+                return typ
+        return "other"
+
     def get_unique_file_path(self, target_dir, original_filename, is_text_log=False):
         if is_text_log:
             return os.path.join(target_dir, original_filename)
@@ -154,8 +3014,21 @@ class QuanLog:
         def consume():
             while not self._stop_event.is_set():
                 try:
-                    content = self.log_queue.get(timeout=0.1)
-                    self.root.after(0, self._update_log_ui, content)
+                    batch = [self.log_queue.get(timeout=0.1)]
+                    while True:
+                        try:
+                            batch.append(self.log_queue.get_nowait())
+
+                        except queue.Empty:
+                            break
+
+                    time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    with self._log_pending_lock:
+                        self._log_pending.extend(f"[{time_str}] {content}" for content in batch)
+                        if self._log_flush_scheduled:
+                            continue
+                        self._log_flush_scheduled = True
+                    self.root.after(self.log_frame_ms, self._update_log_ui)
 
                 except queue.Empty:
                     continue
@@ -170,14 +3043,25 @@ class QuanLog:
 
         threading.Thread(target=consume, daemon=True).start()
 
-    def _update_log_ui(self, content):
-        time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_line = f"[{time_str}] {content}\n"
+    def _update_log_ui(self):
+        with self._log_pending_lock:
+            pending, self._log_pending = self._log_pending, []
+            self._log_flush_scheduled = False
+
+        if len(pending) > self.log_burst_limit:
+            suppressed = len(pending) - self.log_burst_limit
+            pending = pending[-self.log_burst_limit:]
+            pending.insert(0, f"... {suppressed} more messages suppressed")
+
         try:
-            self.log_text.config(state=NORMAL)
-            self.log_text.insert("1.0", log_line)
-            self.log_text.see("1.0")
-            self.log_text.config(state=DISABLED)
+            with self.metrics.timer("log_ui"):
+                self.log_text.config(state=NORMAL)
+                self.log_text.insert("1.0", "".join(f"{line}\n" for line in reversed(pending)))
+                line_count = int(self.log_text.index("end-1c").split(".")[0])
+                if line_count > self.log_max_lines:
+                    self.log_text.delete(f"{self.log_max_lines + 1}.0", END)
+                self.log_text.see("1.0")
+                self.log_text.config(state=DISABLED)
 
         except Exception:
             print("Failed to update log UI:", traceback.format_exc())
@@ -192,28 +3076,12 @@ class QuanLog:
         if log_type not in log_mapping:
             return
 
-        label, tmpl, _ = log_mapping[log_type]
-        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        label, tmpl, keys = log_mapping[log_type]
         try:
-            os.makedirs(os.path.dirname(self.log_file_path), exist_ok=True)
-            if log_type == "text":
-                log_line = f"time: {now_str}, type: {label}, content: {kwargs.get('content', '')}\n"
-                ui = tmpl.format(content=kwargs.get('content', ''))
-
-            elif log_type == "file":
-                fname = kwargs.get("filename", "")
-                size = kwargs.get("size", 0)
-                log_line = f"time: {now_str}, type: {label}, filename: {fname}, size: {size}KB\n"
-                ui = tmpl.format(filename=fname, size=size)
-
-            else:
-                fname = kwargs.get("filename", "")
-                log_line = f"time: {now_str}, type: {label}, filename: {fname}\n"
-                ui = tmpl.format(filename=fname)
-
-            with open(self.log_file_path, "a", encoding="utf-8") as f:
-                f.write(log_line)
-            self.log_queue.put(ui)
+            with self.metrics.timer("log_write"):
+                fields = {k: kwargs.get(k, 0 if k == "size" else "") for k in keys.split(", ")}
+                self.log_writer.write(label, fields)
+                self.log_queue.put(tmpl.format(**fields))
 
         except Exception:
             try:
@@ -222,7 +3090,50 @@ class QuanLog:
             except Exception:
                 pass
 
+    def _load_settings(self):
+        try:
+            with open(self.settings_path, "r", encoding="utf-8") as f:
+                settings = json.load(f)
+
+        except FileNotFoundError:
+            return
+
+        except (OSError, ValueError):
+            self.log_queue.put("_load_settings exception:\n" + traceback.format_exc())
+            return
+
+        for key in self.setting_labels:
+            if isinstance(settings.get(key), bool):
+                setattr(self, key, settings[key])
+
+    def _save_settings(self):
+        tmp_path = f"{self.settings_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({key: getattr(self, key) for key in self.setting_labels}, f, indent=2)
+        os.replace(tmp_path, self.settings_path)
+
+    def _toggle_setting(self, key):
+        try:
+            setattr(self, key, self._setting_vars[key].get())
+            self._save_settings()
+            self.log_queue.put(f"{self.setting_labels[key]}: {'on' if getattr(self, key) else 'off'}")
+
+        except Exception:
+            self.log_queue.put("_toggle_setting exception:\n" + traceback.format_exc())
+
+    def _init_menu(self):
+        menubar = tkinter.Menu(self.root)
+        options = tkinter.Menu(menubar, tearoff=False)
+        for key, label in self.setting_labels.items():
+            self._setting_vars[key] = tkinter.BooleanVar(self.root, value=getattr(self, key))
+            options.add_checkbutton(
+                label=label, variable=self._setting_vars[key], command=lambda key=key: self._toggle_setting(key)
+            )
+        menubar.add_cascade(label="Options", menu=options)
+        self.root.config(menu=menubar)
+
     def _init_ui(self):
+        self._init_menu()
         main_frame = ttkbs.Frame(self.root, padding=2)
         main_frame.pack(fill=BOTH, expand=True)
 
@@ -252,6 +3163,11 @@ class QuanLog:
         self.select_btn.pack(side=LEFT, padx=5, expand=True)
         self.upload_btn.pack(side=RIGHT, padx=5, expand=True)
 
+        self.upload_progress = ttkbs.Progressbar(core_frame, mode="determinate", bootstyle=SUCCESS)
+        self.upload_progress.pack(fill=X, padx=5)
+        self.upload_status = ttkbs.Label(core_frame, text="", font=("Times New Roman", 9))
+        self.upload_status.pack(fill=X, padx=5, pady=(0, 5))
+
         log_frame = ttkbs.LabelFrame(left_frame, text="Operation Log", font=("Times New Roman", 10, "bold"))
         log_frame.pack(fill=BOTH, expand=True, padx=0, pady=0, ipady=0)
 
@@ -266,12 +3182,25 @@ class QuanLog:
 
         self.preview_frame = ttkbs.Frame(mid_frame, padding=5)
         self.preview_frame.pack(fill=BOTH, expand=True)
+        self.preview_frame.bind("<Configure>", self._on_preview_resize)
         self.preview_text = tkinter.Text(self.preview_frame, wrap=WORD, state=DISABLED, font=("Times New Roman", 15))
         self.preview_scrollbar = ttkbs.Scrollbar(self.preview_frame, orient=VERTICAL, command=self.preview_text.yview)
-        self.preview_text.config(yscrollcommand=self.preview_scrollbar.set)
+        self.preview_text.config(yscrollcommand=self._on_preview_scroll)
         self.preview_text.pack(fill=BOTH, expand=True, side=LEFT)
         self.preview_scrollbar.pack(side=RIGHT, fill=Y)
         self.preview_text.bind("<MouseWheel>", self._on_mouse_wheel)
+        for tag, color in (
+            ("keyword", "#0033b3"), ("string", "#067d17"), ("comment", "#8c8c8c"),
+            ("number", "#1750eb"), ("name", "#00627a"), ("key", "#871094")
+        ):
+            self.preview_text.tag_config(f"hl_{tag}", foreground=color)
+        self.preview_text.tag_config("note_title", font=("Times New Roman", 15, "bold"))
+        self.preview_text.tag_config("note_link", foreground="#1f6feb")
+        self.preview_text.tag_config("note_back", foreground="#1f6feb")
+        self.preview_text.tag_bind("note_link", "<Button-1>", self._on_note_click)
+        self.preview_text.tag_bind("note_back", "<Button-1>", lambda e: self._show_note_list(
+            self._note_title, self._note_items
+        ))
 
         right_frame = ttkbs.Frame(main_frame, width=200)
         right_frame.pack(side=RIGHT, fill=BOTH, expand=True)
@@ -294,6 +3223,7 @@ class QuanLog:
         self.file_tree = ttkbs.Treeview(file_list_frame, show="tree")
         self.file_tree.pack(fill=BOTH, expand=True)
         self.file_tree.bind("<<TreeviewSelect>>", self.on_file_click)
+        self.file_tree.bind("<<TreeviewOpen>>", self._on_tree_open)
         self.file_tree.bind("<Double-1>", self.on_file_double_click)
         self.file_tree.bind("<Delete>", self.on_delete_file)
 
@@ -329,142 +3259,548 @@ class QuanLog:
         except Exception:
             self.log_queue.put("select_files exception:\n" + traceback.format_exc())
 
-    def _load_files_worker(self):
+    def _load_files_worker(self, only_if_changed=False):
         cache = {}
         try:
-            if not os.path.exists(self.current_dir):
+            with self.metrics.timer("scan"):
+                changed = self.file_index.refresh()
+                cache = self.file_index.load(self.ninety_days_ago) if changed or not only_if_changed else None
+            if changed or not self.name_index.ready:
+                self._submit_once(self.thread_pool, self._name_sync_lock, self._sync_name_index)
+            self._submit_once(self.thread_pool, self._text_sync_lock, self._sync_text_index)
+            if not self._video_sync_scheduled:
+                self._video_sync_scheduled = True
+                self.root.after(self.video_sync_delay_ms, self._start_video_sync)
+
+            elif changed:
+                self._start_video_sync()
+
+        except Exception:
+            self.log_queue.put("_load_files_worker exception:\n" + traceback.format_exc())
+
+        finally:
+            if cache is not None:
                 self.root.after(0, self._update_file_tree, cache)
+
+    @staticmethod
+    def _submit_once(pool, lock, fn):
+        if not lock.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                fn()
+
+            finally:
+                lock.release()
+
+        try:
+            return pool.submit(run)
+
+        except Exception:
+            lock.release()
+            raise
+
+    def _sync_name_index(self):
+        try:
+            with self.metrics.timer("name_index_sync"):
+                self.name_index.sync(self.file_index.all_files())
+
+        except Exception:
+            self.log_queue.put("_sync_name_index exception:\n" + traceback.format_exc())
+
+    def _update_name_index(self, fp):
+        date_str = self.file_index.date_of(fp)
+        if date_str is not None and path_exists(fp):
+            self.name_index.add(fp, date_str)
+
+        else:
+            self.name_index.remove(fp)
+
+    def _sync_text_index(self):
+        try:
+            self.text_index.sync(self.file_index.files_of_type("text"), self._stop_event.is_set)
+
+        except Exception:
+            self.log_queue.put("_sync_text_index exception:\n" + traceback.format_exc())
+
+    def _start_video_sync(self):
+        try:
+            self._submit_once(self.media_pool, self._video_sync_lock, self._sync_video_thumbnails)
+
+        except Exception:
+            self.log_queue.put("_start_video_sync exception:\n" + traceback.format_exc())
+
+    def _sync_video_thumbnails(self):
+        for fp, _ in self.file_index.files_of_type("video"):
+            if self._stop_event.is_set():
                 return
 
-            for year in os.listdir(self.current_dir):
-                yp = os.path.join(self.current_dir, year)
-                if not self._is_valid_dir(yp, year, 4):
-                    continue
+            if split_pack_path(fp):
+                continue
 
-                for month in os.listdir(yp):
-                    mp = os.path.join(yp, month)
-                    if not self._is_valid_dir(mp, month, 2):
-                        continue
+            try:
+                self.video_thumbnailer.extract(fp, self._preview_box)
+                if self.video_proxy_enabled:
+                    self.video_proxy.generate(fp, self._preview_box, self._stop_event.is_set)
 
-                    for day in os.listdir(mp):
-                        dp = os.path.join(mp, day)
-                        if not self._is_valid_dir(dp, day, 2):
-                            continue
-                        date_str = f"{year}-{month}-{day}"
+            except Exception:
+                self.log_queue.put("_sync_video_thumbnails exception:\n" + traceback.format_exc())
 
-                        try:
-                            if datetime.strptime(date_str, "%Y-%m-%d").date() < self.ninety_days_ago:
-                                continue
+    def _generate_video_proxy(self, fp):
+        try:
+            if self.video_proxy.generate(fp, self._preview_box, self._stop_event.is_set):
+                self.log_queue.put(f"Preview proxy ready: {os.path.basename(fp)}")
 
-                        except Exception:
-                            continue
+        except Exception:
+            self.log_queue.put("_generate_video_proxy exception:\n" + traceback.format_exc())
+
+    def _schedule_cold_storage(self):
+        if self._stop_event.is_set():
+            return
+
+        try:
+            if self.cold_storage_enabled:
+                self.thread_pool.submit(self._cold_storage_worker)
+
+        except Exception:
+            self.log_queue.put("_schedule_cold_storage exception:\n" + traceback.format_exc())
+
+        self.root.after(self.cold_storage_interval_ms, self._schedule_cold_storage)
+
+    def _cold_storage_worker(self):
+        if not self._cold_storage_lock.acquire(blocking=False):
+            return
+
+        packed_any = False
+        try:
+            for month_path in self.cold_storage.due_months(self.cold_storage_age_days):
+                if self._stop_event.is_set():
+                    break
+
+                with self.metrics.timer("cold_storage_pack"):
+                    pack_path, packed = self.cold_storage.pack_month(month_path, self._stop_event.is_set)
+                for path in packed:
+                    self.blob_store.release(path)
+                if packed:
+                    packed_any = True
+                    self.log_queue.put(
+                        f"Packed {os.path.relpath(pack_path, self.current_dir)} ({len(packed)} files)"
+                    )
+            self.cold_storage.purge_unpacked()
 
-                        files = []
-                        for f in os.listdir(dp):
-                            fp = os.path.join(dp, f)
-                            if os.path.isfile(fp) and not f.endswith(".log"):
-                                files.append(fp)
-                        if files:
-                            cache[date_str] = files
+        except InterruptedError:
+            pass
 
         except Exception:
-            self.log_queue.put("_load_files_worker exception:\n" + traceback.format_exc())
+            self.log_queue.put("_cold_storage_worker exception:\n" + traceback.format_exc())
 
         finally:
-            self.root.after(0, self._update_file_tree, cache)
+            self._cold_storage_lock.release()
 
-    @staticmethod
-    def _is_valid_dir(path, name, length):
-        return os.path.isdir(path) and name.isdigit() and len(name) == length
+        if packed_any and not self._stop_event.is_set():
+            self._load_files_worker(only_if_changed=True)
 
-    def _update_file_tree(self, cache):
+    def _update_text_index(self, fp):
         try:
-            self.file_tree.delete(*self.file_tree.get_children())
+            if path_exists(fp) and self._file_type(fp) == "text":
+                self.text_index.index_file(fp)
+
+            else:
+                self.text_index.remove(fp)
+
+        except Exception:
+            self.log_queue.put("_update_text_index exception:\n" + traceback.format_exc())
+
+    def _display_name(self, fp):
+        name = os.path.basename(fp)
+        display = self._display_names.get(name)
+        if display is None:
+            display = self._display_names[name] = self._truncate_filename(name)
+        return display
+
+    def _clear_tree(self):
+        self._tree_gen += 1
+        self.file_tree.delete(*self.file_tree.get_children())
+        self._tree_nodes.clear()
+        self._date_nodes.clear()
+        self._populated_dates.clear()
 
-            for date_str in sorted(cache.keys(), reverse=True):
-                node = self.file_tree.insert("", END, text=f"📅 {date_str}", open=True)
+    def _update_file_tree(self, cache):
+        if self._search_keyword:
+            return
 
-                for fp in sorted(cache[date_str]):
-                    name = self._truncate_filename(os.path.basename(fp))
-                    self.file_tree.insert(node, END, text=name, values=(fp,))
+        try:
+            with self.metrics.timer("tree_update"):
+                self._clear_tree()
+                self._tree_cache = {d: sorted(files) for d, files in cache.items()}
+                self._insert_date_chunk(self._tree_gen, sorted(cache.keys(), reverse=True), 0)
 
         except Exception:
             self.log_queue.put("_update_file_tree exception:\n" + traceback.format_exc())
 
-    def _load_files_thread(self):
+    def _insert_date_chunk(self, gen, dates, start):
+        if gen != self._tree_gen:
+            return
+
+        try:
+            deadline = time.perf_counter() + self.tree_slice_seconds
+            i = start
+            while i < len(dates) and (i == start or time.perf_counter() < deadline):
+                self._insert_date_node(dates[i], END)
+                i += 1
+
+            if i < len(dates):
+                self.root.after(1, self._insert_date_chunk, gen, dates, i)
+
+            if start == 0 and dates:
+                self._expand_date(dates[0])
+
+        except Exception:
+            self.log_queue.put("_insert_date_chunk exception:\n" + traceback.format_exc())
+
+    def _insert_date_node(self, date_str, index):
+        node = self.file_tree.insert("", index, text=f"📅 {date_str}", open=False)
+        self.file_tree.insert(node, END, text="...")
+        self._date_nodes[date_str] = node
+        return node
+
+    def _on_tree_open(self, event):
+        if self._search_keyword:
+            return
+
+        text = self.file_tree.item(self.file_tree.focus(), "text")
+        if text.startswith("📅"):
+            self._populate_date(text[2:])
+
+    def _expand_date(self, date_str):
+        node = self._date_nodes.get(date_str)
+        if node is not None:
+            self.file_tree.item(node, open=True)
+            self._populate_date(date_str)
+
+    def _populate_date(self, date_str):
+        node = self._date_nodes.get(date_str)
+        if node is None or date_str in self._populated_dates:
+            return
+
+        try:
+            self._populated_dates.add(date_str)
+            self.file_tree.delete(*self.file_tree.get_children(node))
+            files = list(self._tree_cache.get(date_str, ()))
+            self._insert_file_chunk(self._tree_gen, date_str, node, files, 0)
+
+        except Exception:
+            self.log_queue.put("_populate_date exception:\n" + traceback.format_exc())
+
+    def _insert_file_chunk(self, gen, date_str, node, files, start):
+        if gen != self._tree_gen or self._date_nodes.get(date_str) != node:
+            return
+
+        try:
+            deadline = time.perf_counter() + self.tree_slice_seconds
+            i = start
+            while i < len(files) and (i == start or time.perf_counter() < deadline):
+                fp = files[i]
+                i += 1
+                if fp in self._tree_nodes or not self._cache_contains(date_str, fp):
+                    continue
+                self._tree_nodes[fp] = self.file_tree.insert(node, END, text=self._display_name(fp), values=(fp,))
+
+            if i < len(files):
+                self.root.after(1, self._insert_file_chunk, gen, date_str, node, files, i)
+
+        except Exception:
+            self.log_queue.put("_insert_file_chunk exception:\n" + traceback.format_exc())
+
+    def _cache_contains(self, date_str, fp):
+        files = self._tree_cache.get(date_str, [])
+        i = bisect.bisect_left(files, fp)
+        return i < len(files) and files[i] == fp
+
+    def _cache_insert(self, date_str, fp):
+        files = self._tree_cache.setdefault(date_str, [])
+        i = bisect.bisect_left(files, fp)
+        if i < len(files) and files[i] == fp:
+            return False
+        files.insert(i, fp)
+        return True
+
+    def _cache_discard(self, date_str, fp):
+        files = self._tree_cache.get(date_str, [])
+        i = bisect.bisect_left(files, fp)
+        if i < len(files) and files[i] == fp:
+            del files[i]
+
+    @staticmethod
+    def _stat_key(fp):
+        try:
+            st = os.stat(fp)
+            return st.st_size, st.st_mtime_ns
+
+        except OSError:
+            return None
+
+    @contextlib.contextmanager
+    def _own_write(self, fp):
+        with self._own_writes_lock:
+            self._own_writes[fp] = (None, time.monotonic())
+        try:
+            yield
+
+        finally:
+            now = time.monotonic()
+            with self._own_writes_lock:
+                self._own_writes[fp] = (self._stat_key(fp), now)
+                for stale in [p for p, (_, t) in self._own_writes.items() if now - t > self.own_write_ttl]:
+                    del self._own_writes[stale]
+
+    def _is_own_write(self, fp):
+        with self._own_writes_lock:
+            entry = self._own_writes.pop(fp, None)
+        if entry is None or time.monotonic() - entry[1] > self.own_write_ttl:
+            return False
+        return entry[0] is None or entry[0] == self._stat_key(fp)
+
+    def _schedule_rescan(self):
+        with self._rescan_lock:
+            if self._rescan_pending:
+                return
+            self._rescan_pending = True
+        self.root.after(self.rescan_delay_ms, self._run_rescan)
+
+    def _run_rescan(self):
+        with self._rescan_lock:
+            self._rescan_pending = False
+        self._load_files_thread()
+
+    def _on_fs_event(self, event, path, dest=None):
+        try:
+            if event == "rescan":
+                self._schedule_rescan()
+                return
+
+            if event == "created" and self._is_own_write(path):
+                return
+
+            if event == "deleted":
+                self.blob_store.release(path)
+
+            elif event == "moved":
+                self.blob_store.rename(path, dest)
+
+            if event in ("deleted", "moved"):
+                self.file_index.remove(path)
+                self._update_name_index(path)
+                self._update_text_index(path)
+
+            if event in ("created", "moved"):
+                self.file_index.add(dest or path)
+                self._update_name_index(dest or path)
+                self._update_text_index(dest or path)
+            self.root.after(0, self._apply_fs_event, event, path, dest)
+
+        except Exception:
+            self.log_queue.put("_on_fs_event exception:\n" + traceback.format_exc())
+
+    def _apply_fs_event(self, event, path, dest=None):
+        if self._search_keyword:
+            return
+
+        try:
+            if event == "created":
+                self._tree_add_file(path)
+
+            elif event == "deleted":
+                self._tree_remove_file(path)
+
+            elif event == "moved":
+                iid = self._tree_nodes.get(path)
+                old_date = self.file_index.date_of(path)
+                date_str = self.file_index.date_of(dest)
+                if iid is None or date_str not in self._populated_dates:
+                    self._tree_remove_file(path)
+                    self._tree_add_file(dest)
+                    return
+
+                del self._tree_nodes[path]
+                self._tree_nodes[dest] = iid
+                self._cache_discard(old_date, path)
+                self._cache_insert(date_str, dest)
+                parent = self._date_nodes[date_str]
+                self.file_tree.item(iid, text=self._display_name(dest), values=(dest,))
+                self.file_tree.move(iid, parent, self._child_position(parent, dest, exclude=iid))
+                self._drop_empty_date(old_date)
+
+        except Exception:
+            self.log_queue.put("_apply_fs_event exception:\n" + traceback.format_exc())
+
+    def _child_position(self, parent, fp, exclude=None):
+        children = [c for c in self.file_tree.get_children(parent) if c != exclude]
+        lo, hi = 0, len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if str(self.file_tree.item(children[mid])["values"][0]) < fp:
+                lo = mid + 1
+
+            else:
+                hi = mid
+        return lo
+
+    def _date_position(self, date_str):
+        return sum(1 for d in self._date_nodes if d > date_str)
+
+    def _tree_add_file(self, fp):
+        date_str = self.file_index.date_of(fp)
+        if date_str is None or date_str < self.ninety_days_ago.strftime("%Y-%m-%d"):
+            return
+
+        if fp in self._tree_nodes or not os.path.isfile(fp) or not self._cache_insert(date_str, fp):
+            return
+
+        if date_str not in self._date_nodes:
+            self._insert_date_node(date_str, self._date_position(date_str))
+            self._expand_date(date_str)
+
+        elif date_str in self._populated_dates:
+            parent = self._date_nodes[date_str]
+            self._tree_nodes[fp] = self.file_tree.insert(
+                parent, self._child_position(parent, fp), text=self._display_name(fp), values=(fp,)
+            )
+
+    def _tree_remove_file(self, fp):
+        date_str = self.file_index.date_of(fp)
+        self._cache_discard(date_str, fp)
+        iid = self._tree_nodes.pop(fp, None)
+        if iid is not None and self.file_tree.exists(iid):
+            self.file_tree.delete(iid)
+        self._drop_empty_date(date_str)
+
+    def _drop_empty_date(self, date_str):
+        if self._tree_cache.get(date_str):
+            return
+
+        self._tree_cache.pop(date_str, None)
+        self._populated_dates.discard(date_str)
+        node = self._date_nodes.pop(date_str, None)
+        if node is not None and self.file_tree.exists(node):
+            self.file_tree.delete(node)
+
+    def _load_files_thread(self, only_if_changed=False):
         try:
-            self.thread_pool.submit(self._load_files_worker)
+            self.thread_pool.submit(self._load_files_worker, only_if_changed)
 
         except Exception:
             self.log_queue.put("_load_files_thread exception:\n" + traceback.format_exc())
 
     def filter_file_list(self, event):
+        if self._search_after_id is not None:
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = self.root.after(self.search_debounce_ms, self._start_search)
+
+    def _start_search(self):
+        self._search_after_id = None
         kw = self.search_entry.get().strip().lower()
+        if kw == self._search_keyword:
+            return
+
+        self._search_keyword = kw
+        self._search_gen += 1
+        if kw.startswith("log:"):
+            self.switch_preview("text")
+            self.thread_pool.submit(self._preview_log_query, kw[4:])
+            return
+
+        if kw.startswith("note:"):
+            self.switch_preview("text")
+            self.thread_pool.submit(self._preview_note_range, kw[5:].strip())
+            return
+
         if not kw:
             self._load_files_thread()
             return
-        res = {}
 
         try:
-            self._fast_search(kw, res)
-            self.file_tree.delete(*self.file_tree.get_children())
-            if not res:
-                self.file_tree.insert("", END, text="No matching files found")
-                return
+            self._clear_tree()
+            self.thread_pool.submit(self._search_worker, kw, self._search_gen)
 
-            for d in sorted(res.keys(), reverse=True):
-                node = self.file_tree.insert("", END, text=f"📅 {d}", open=True)
-                for fp in sorted(res[d]):
-                    self.file_tree.insert(
-                        node, END, text=self._truncate_filename(os.path.basename(fp)), values=(fp,)
-                    )
+        except Exception:
+            self.log_queue.put("_start_search exception:\n" + traceback.format_exc())
+
+    def _search_worker(self, keyword, gen):
+        found = 0
+        try:
+            with self.metrics.timer("search"):
+                for date_key, files in self._fast_search(keyword, lambda: gen != self._search_gen):
+                    found += len(files)
+                    self.root.after(0, self._add_search_results, gen, date_key, files)
+
+                if gen == self._search_gen:
+                    hits = self.text_index.search(keyword)
+                    found += len(hits)
+                    self.root.after(0, self._add_content_results, gen, hits)
 
         except Exception:
-            self.log_queue.put("filter_file_list exception:\n" + traceback.format_exc())
+            self.log_queue.put("_search_worker exception:\n" + traceback.format_exc())
+
+        finally:
+            self.root.after(0, self._finish_search, gen, found)
+
+    def _search_date_node(self, date_key):
+        node = self._date_nodes.get(date_key)
+        if node is None:
+            node = self.file_tree.insert("", self._date_position(date_key), text=f"📅 {date_key}", open=True)
+            self._date_nodes[date_key] = node
+        return node
 
-    def _fast_search(self, keyword, result):
-        target_years = {self.current_year, self.last_year}
-        root = self.current_dir
-        if not os.path.exists(root):
+    def _add_search_results(self, gen, date_key, files):
+        if gen != self._search_gen:
             return
 
-        for year_dir in os.listdir(root):
-            if year_dir not in target_years:
-                continue
+        try:
+            node = self._search_date_node(date_key)
+            for fp in files:
+                self._tree_nodes[fp] = self.file_tree.insert(node, END, text=self._display_name(fp), values=(fp,))
 
-            year_path = os.path.join(root, year_dir)
-            if not os.path.isdir(year_path):
-                continue
+        except Exception:
+            self.log_queue.put("_add_search_results exception:\n" + traceback.format_exc())
 
-            for month_dir in os.listdir(year_path):
-                if not month_dir.isdigit() or len(month_dir) != 2:
-                    continue
+    def _add_content_results(self, gen, hits):
+        if gen != self._search_gen:
+            return
 
-                month_path = os.path.join(year_path, month_dir)
-                if not os.path.isdir(month_path):
+        try:
+            for fp, lines in hits:
+                date_key = self.file_index.date_of(fp)
+                if fp in self._tree_nodes or date_key is None:
                     continue
+                lineno, snippet = lines[0]
+                self._tree_nodes[fp] = self.file_tree.insert(
+                    self._search_date_node(date_key), END,
+                    text=f"📝 {self._display_name(fp)}  L{lineno}: {snippet}",
+                    values=(fp,)
+                )
 
-                for day_dir in os.listdir(month_path):
-                    if not day_dir.isdigit() or len(day_dir) != 2:
-                        continue
+        except Exception:
+            self.log_queue.put("_add_content_results exception:\n" + traceback.format_exc())
 
-                    day_path = os.path.join(month_path, day_dir)
-                    if not os.path.isdir(day_path):
-                        continue
-                    date_key = f"{year_dir}-{month_dir}-{day_dir}"
+    def _finish_search(self, gen, found):
+        if gen == self._search_gen and not found:
+            self.file_tree.insert("", END, text="No matching files found")
 
-                    try:
-                        files = []
-                        for fname in os.listdir(day_path):
-                            fpath = os.path.join(day_path, fname)
+    def _fast_search(self, keyword, cancelled):
+        if self.name_index.ready:
+            found = {}
+            for fp, date_str in self.name_index.search(keyword):
+                found.setdefault(date_str, []).append(fp)
 
-                            if os.path.isfile(fpath) and not fname.endswith(".log") and keyword in fname.lower():
-                                files.append(fpath)
-                        if files:
-                            result[date_key] = files
+        else:
+            found = self.file_index.find(keyword)
 
-                    except Exception:
-                        continue
+        for date_key in sorted(found, reverse=True):
+            if cancelled():
+                return
+            yield date_key, found[date_key]
 
     def _upload_worker(self):
         try:
@@ -483,36 +3819,118 @@ class QuanLog:
                     True
                 )
 
-                with open(target, "a", encoding="utf-8") as f:
-                    f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n{text}\n\n")
+                with self._own_write(target):
+                    self.note_journal.append(target, text)
+                self.file_index.add(target)
+                self._update_name_index(target)
+                self._update_text_index(target)
+                self.root.after(0, self._apply_fs_event, "created", target)
                 self.write_log("text", content=text)
 
             if self.selected_files:
-                for src in self.selected_files:
-                    try:
-                        if not os.path.isfile(src):
-                            continue
-                        fname = os.path.basename(src)
-                        is_text_log = bool(fname.endswith('.txt') and re.match(r'^\d{8}\.txt$', fname))
-                        target = self.get_unique_file_path(self.date_path, fname, is_text_log)
-                        shutil.copy2(src, target)
-                        size = round(os.path.getsize(src) / 1024, 2)
-                        self.write_log("file", filename=os.path.basename(target), size=size)
-
-                    except Exception:
-                        self.log_queue.put("_upload_worker file copy exception:\n" + traceback.format_exc())
+                self._upload_files(self.selected_files)
 
         except Exception:
             self.log_queue.put("_upload_worker exception:\n" + traceback.format_exc())
 
         finally:
             self.root.after(0, lambda: (
-                self._load_files_thread(),
                 self._reset_state(),
                 self.select_btn.config(state=NORMAL),
                 setattr(self, 'is_working', False)
             ))
 
+    def _upload_files(self, files):
+        jobs = []
+        for src in files:
+            try:
+                if os.path.isfile(src):
+                    jobs.append((os.path.getsize(src), src))
+
+            except OSError:
+                continue
+        jobs.sort(reverse=True)
+
+        allocator = NameAllocator(self.date_path)
+        with self._upload_lock:
+            self._upload_state = {
+                "files": len(jobs), "files_done": 0,
+                "bytes": sum(size for size, _ in jobs), "bytes_done": 0,
+                "start": time.monotonic(), "last": "", "ui_time": 0.0
+            }
+        self.root.after(0, self._refresh_upload_progress)
+
+        with self.metrics.timer("upload_batch"), ThreadPoolExecutor(max_workers=self.upload_workers) as pool:
+            wait([pool.submit(self._upload_one, src, size, allocator) for size, src in jobs])
+
+        self.root.after(0, self._refresh_upload_progress, True)
+
+    def _upload_one(self, src, size, allocator):
+        try:
+            fname = os.path.basename(src)
+            is_text_log = bool(DAILY_NOTE_PATTERN.match(fname))
+            target = allocator.allocate(fname, is_text_log)
+            start = time.monotonic()
+            with self.metrics.timer("upload_file"), self._own_write(target):
+                if self.dedup_enabled and not is_text_log:
+                    if self.blob_store.store(src, target, self._upload_progress_add):
+                        self.log_queue.put(f"Deduplicated: {os.path.basename(target)}")
+
+                else:
+                    fast_copy(src, target, self._upload_progress_add)
+            rate = size / max(time.monotonic() - start, 1e-6) / (1024 * 1024)
+
+            self.file_index.add(target)
+            self._update_name_index(target)
+            self._update_text_index(target)
+            self.root.after(0, self._apply_fs_event, "created", target)
+            self.write_log("file", filename=os.path.basename(target), size=round(size / 1024, 2))
+            if self._file_type(target) == "image":
+                self.thread_pool.submit(self._warm_thumbnail, target)
+
+            elif self._file_type(target) == "video":
+                self.media_pool.submit(self.video_thumbnailer.extract, target, self._preview_box)
+                if self.video_proxy_enabled:
+                    self.media_pool.submit(self._generate_video_proxy, target)
+
+            with self._upload_lock:
+                self._upload_state["files_done"] += 1
+                self._upload_state["last"] = f"{self._truncate_filename(fname)} ({rate:.1f} MB/s)"
+
+        except Exception:
+            self.log_queue.put("_upload_worker file copy exception:\n" + traceback.format_exc())
+
+    def _upload_progress_add(self, n):
+        with self._upload_lock:
+            state = self._upload_state
+            state["bytes_done"] += n
+            now = time.monotonic()
+            if now - state["ui_time"] < 0.1:
+                return
+            state["ui_time"] = now
+        self.root.after(0, self._refresh_upload_progress)
+
+    def _refresh_upload_progress(self, finished=False):
+        with self._upload_lock:
+            state = dict(self._upload_state)
+
+        try:
+            elapsed = max(time.monotonic() - state["start"], 1e-6)
+            rate = state["bytes_done"] / elapsed / (1024 * 1024)
+            self.upload_progress.config(value=100 * state["bytes_done"] / max(state["bytes"], 1))
+            if finished:
+                self.upload_status.config(
+                    text=f"Uploaded {state['files_done']}/{state['files']} files in {elapsed:.1f}s ({rate:.1f} MB/s)"
+                )
+
+            else:
+                self.upload_status.config(
+                    text=f"{state['files_done']}/{state['files']} files, {rate:.1f} MB/s  {state['last']}"
+                )
+
+        except Exception:
+            self.log_queue.put("_refresh_upload_progress exception:\n" + traceback.format_exc())
+
     def _upload_thread(self):
         if self.is_working:
             Messagebox.show_info("Info", "Task is running!")
@@ -559,12 +3977,20 @@ class QuanLog:
     def _delete_worker(self, fp, tree_item):
         for i in range(3):
             try:
-                if os.path.exists(fp):
-                    os.remove(fp)
+                with self.metrics.timer("delete"):
+                    if split_pack_path(fp):
+                        self.cold_storage.remove(fp)
+
+                    elif os.path.exists(fp):
+                        os.remove(fp)
+                    self.file_index.remove(fp)
+                    self.name_index.remove(fp)
+                    self.blob_store.release(fp)
+                    self._update_text_index(fp)
                 self.root.after(0, lambda: (
-                    self.file_tree.delete(tree_item),
-                    self.switch_preview("text"),
-                    self._load_files_thread()
+                    self._apply_fs_event("deleted", fp),
+                    self.file_tree.exists(tree_item) and self.file_tree.delete(tree_item),
+                    self.switch_preview("text")
                 ))
                 self.write_log("delete", filename=os.path.basename(fp))
                 return
@@ -589,10 +4015,11 @@ class QuanLog:
             return
 
         fp = item["values"][0] if item["values"] else None
-        if not fp or not os.path.isfile(fp):
+        if not fp or not path_exists(fp):
             return
 
         try:
+            fp = self.cold_storage.materialize(fp)
             subprocess.run(
                 f'powershell -Command "Set-Clipboard -Path \'{fp.replace(chr(39), chr(39) * 2)}\'"',
                 shell=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW
@@ -615,6 +4042,7 @@ class QuanLog:
         try:
             if os.path.splitext(fp)[-1].lower() not in self.FILE_TYPES["direct_open"]:
                 self._preview_file(fp)
+            self._prefetch_neighbours(sel[0])
 
         except Exception:
             self.log_queue.put("on_file_click exception:\n" + traceback.format_exc())
@@ -645,6 +4073,7 @@ class QuanLog:
 
     def _open_file(self, fp):
         try:
+            fp = self.cold_storage.materialize(fp)
             if os.path.exists(fp):
                 os.startfile(fp)
                 self.log_queue.put(f"File opened: {os.path.basename(fp)}")
@@ -653,7 +4082,7 @@ class QuanLog:
             self.log_queue.put("_open_file exception:\n" + traceback.format_exc())
 
     def _preview_file(self, fp):
-        if not os.path.isfile(fp):
+        if not path_exists(fp):
             return
 
         ext = os.path.splitext(fp)[-1].lower()
@@ -666,20 +4095,33 @@ class QuanLog:
                 self.switch_preview("media")
                 self.thread_pool.submit(self._preview_image, fp)
 
+            elif ext in self.FILE_TYPES["video"] and split_pack_path(fp):
+                self.thread_pool.submit(self._preview_packed_video, fp)
+
             elif ext in self.FILE_TYPES["video"]:
                 if self.current_playing_video != fp or not self.is_playing_video:
                     self.safe_stop_video()
                     self.switch_preview("media")
+                    self._show_video_previews(fp, self.video_thumbnailer.get(fp))
                     self._play_video(fp)
 
         except Exception:
             self.log_queue.put("_preview_file exception:\n" + traceback.format_exc())
 
+    def _preview_packed_video(self, fp):
+        try:
+            self.root.after(0, self._preview_file, self.cold_storage.materialize(fp))
+
+        except Exception:
+            self.log_queue.put("_preview_packed_video exception:\n" + traceback.format_exc())
+
     def switch_preview(self, typ):
         try:
+            self._tile_view = None
             self.safe_stop_video()
             self.preview_text.pack_forget()
             self.preview_scrollbar.pack_forget()
+            self._close_text_pager()
             self.preview_text.config(state=NORMAL)
             self.preview_text.delete("1.0", END)
             self.preview_text.config(state=DISABLED)
@@ -690,6 +4132,7 @@ class QuanLog:
 
             elif typ == "media":
                 self.preview_media_label = ttkbs.Label(self.preview_frame, anchor=CENTER)
+                self.preview_media_label.image = None
                 self.preview_media_label.pack(fill=BOTH, expand=True, side=LEFT)
 
         except Exception:
@@ -697,44 +4140,334 @@ class QuanLog:
 
     def _preview_text(self, fp):
         content = ""
+        pager = None
         try:
-            for enc in ["utf-8", "gbk", "gb2312", "utf-8-sig"]:
-                try:
-                    with open(fp, "r", encoding=enc) as f:
-                        lines = f.readlines()
-                        if fp.lower().endswith(".log"):
-                            res = []
-                            for line in reversed(lines):
-                                line = line.strip()
-                                if line:
-                                    res.append(f"{self._format_log_line(line)}\n\n")
-                            content = "".join(res)
-                        else:
-                            content = "".join(lines)
-                    break
+            if DAILY_NOTE_PATTERN.match(os.path.basename(fp)):
+                self._preview_note(fp)
+                return
 
-                except Exception:
-                    continue
+            with self.metrics.timer("preview_text"):
+                if fp.lower().endswith(".log"):
+                    pager = LogPager(self._log_reader(fp), self._format_log_line)
+                    content = pager.next_page()
+
+                else:
+                    content, pager = self._load_text_pages(fp)
 
         except Exception:
             self.log_queue.put("_preview_text exception:\n" + traceback.format_exc())
             content = ""
 
-        self.root.after(0, self._update_text_preview, content)
+        self.root.after(0, self._update_text_preview, content, pager)
+
+    def _load_text_pages(self, fp, keep_pager=True):
+        key = self.preview_cache.key(fp, "text")
+        cached = self.preview_cache.get(key)
+        if cached is not None:
+            content, offset, encoding = cached
+            return content, TextPager(fp, offset, encoding) if keep_pager else None
+
+        pager = TextPager(fp)
+        content = pager.next_page() + pager.next_page()
+        self.preview_cache.put(key, (content, pager.offset, pager.encoding))
+        if not keep_pager:
+            pager.close()
+            pager = None
+        return content, pager
+
+    def _load_image_preview(self, fp):
+        key = self.preview_cache.key(fp, "image", self._preview_box)
+        img = self.preview_cache.get(key)
+        if img is None:
+            img = self.thumbnail_cache.get(fp, self._preview_box)
+            self.preview_cache.put(key, img)
+        return img
+
+    def _prefetch_neighbours(self, iid):
+        for sibling in (self.file_tree.prev(iid), self.file_tree.next(iid)):
+            if not sibling:
+                continue
+            values = self.file_tree.item(sibling, "values")
+            if not values:
+                continue
+
+            fp = str(values[0])
+            typ = self._file_type(fp)
+            if typ in ("text", "image") and not fp.lower().endswith(".log") and fp not in self._prefetching:
+                self._prefetching.add(fp)
+                self.thread_pool.submit(self._prefetch_preview, fp, typ)
+
+    def _prefetch_preview(self, fp, typ):
+        try:
+            if typ == "text":
+                self._load_text_pages(fp, keep_pager=False)
+
+            elif max(TilePyramid.image_size(fp)) <= self.tiled_min_side:
+                self._load_image_preview(fp)
+
+        except Exception:
+            pass
+
+        finally:
+            self._prefetching.discard(fp)
+
+    def _log_reader(self, fp):
+        index_path = os.path.join(self.current_dir, META_DIR, "logs", os.path.basename(fp) + ".idx")
+        return LogReader(fp, index_path)
+
+    def _preview_log_query(self, query):
+        types = set()
+        day_prefix = ""
+        for token in query.split():
+            if re.match(r"^\d{4}(-\d{2}(-\d{2})?)?$", token):
+                day_prefix = token
+
+            else:
+                types.add(LOG_TYPE_ALIASES.get(token, token.upper()))
+
+        year = day_prefix[:4] or self.current_year
+        fp = os.path.join(self.current_dir, year, f"{year}.log")
+        content = ""
+        pager = None
+        try:
+            if os.path.isfile(fp):
+                pager = LogPager(self._log_reader(fp), self._format_log_line, types, day_prefix)
+                content = pager.next_page() or "No matching log entries found"
+
+        except Exception:
+            self.log_queue.put("_preview_log_query exception:\n" + traceback.format_exc())
+
+        self.root.after(0, self._update_text_preview, content, pager)
+
+    def _preview_note(self, fp):
+        try:
+            with self.metrics.timer("preview_note"):
+                items = self.note_journal.list_entries(fp)
+            if not items or self.note_journal.has_preamble(fp, items[0][2]):
+                content, pager = self._load_text_pages(fp)
+                self.root.after(0, self._update_text_preview, content, pager)
+                return
+            self.root.after(0, self._show_note_list, os.path.basename(fp), items)
+
+        except Exception:
+            self.log_queue.put("_preview_note exception:\n" + traceback.format_exc())
+
+    def _preview_note_range(self, spec):
+        try:
+            start, end = NoteJournal.parse_range(spec)
+
+        except ValueError:
+            self.root.after(0, self._update_text_preview, f"Invalid note range: {spec}")
+            return
+
+        try:
+            items = self.note_journal.list_range(start, end, self._stop_event.is_set)
+            self.root.after(0, self._show_note_list, f"Notes {start} .. {end}", items)
 
-    def _update_text_preview(self, content):
+        except Exception:
+            self.log_queue.put("_preview_note_range exception:\n" + traceback.format_exc())
+
+    def _show_note_list(self, title, items):
         try:
+            self._close_text_pager()
+            self._note_title = title
+            self._note_items = items
+            lines = [f"{when:%Y-%m-%d %H:%M}  {summary}\n" for _, when, _, _, summary in items]
             self.preview_text.config(state=NORMAL)
             self.preview_text.delete("1.0", END)
-            if content:
-                self.preview_text.insert("1.0", content)
+            self.preview_text.insert(END, f"{title} ({len(items)} entries)\n\n", "note_title")
+            self.preview_text.insert(END, "".join(lines) or "No note entries found", "note_link" if lines else ())
+            self.preview_text.config(state=DISABLED)
+
+        except Exception:
+            self.log_queue.put("_show_note_list exception:\n" + traceback.format_exc())
+
+    def _on_note_click(self, event):
+        line = int(self.preview_text.index(f"@{event.x},{event.y}").split(".")[0])
+        if 3 <= line < len(self._note_items) + 3:
+            self.thread_pool.submit(self._load_note_entry, self._note_items[line - 3])
+
+    def _load_note_entry(self, item):
+        fp, when, offset, length, _ = item
+        try:
+            content = self.note_journal.read_entry(fp, offset, length)
+            self.root.after(0, self._show_note_entry, content)
+
+        except Exception:
+            self.log_queue.put("_load_note_entry exception:\n" + traceback.format_exc())
+
+    def _show_note_entry(self, content):
+        try:
+            self.preview_text.config(state=NORMAL)
+            self.preview_text.delete("1.0", END)
+            self.preview_text.insert(END, f"◀ {self._note_title}\n\n", "note_back")
+            self.preview_text.insert(END, content)
             self.preview_text.config(state=DISABLED)
 
+        except Exception:
+            self.log_queue.put("_show_note_entry exception:\n" + traceback.format_exc())
+
+    def _update_text_preview(self, content, pager=None):
+        try:
+            self._close_text_pager()
+            self._text_pager = pager
+            with self.metrics.timer("preview_insert"):
+                self.preview_text.config(state=NORMAL)
+                self.preview_text.delete("1.0", END)
+                if content:
+                    self.preview_text.insert("1.0", content)
+                self.preview_text.config(state=DISABLED)
+
+            fp = getattr(pager, "fp", None)
+            self._hl_lang = SyntaxHighlighter.language_for(fp)
+            if self._hl_lang is not None:
+                self._hl_key = self.preview_cache.key(fp, "highlight", self.highlight_block_lines)
+                self._schedule_highlight()
+
         except Exception:
             self.log_queue.put("_update_text_preview exception:\n" + traceback.format_exc())
 
+    def _reset_highlight(self):
+        self._hl_gen += 1
+        self._hl_lang = None
+        self._hl_key = None
+        self._hl_applied.clear()
+        self._hl_pending.clear()
+        if self._hl_after_id is not None:
+            self.root.after_cancel(self._hl_after_id)
+            self._hl_after_id = None
+
+    def _schedule_highlight(self):
+        if self._hl_lang is None or self._hl_after_id is not None:
+            return
+        self._hl_after_id = self.root.after(self.highlight_delay_ms, self._highlight_viewport)
+
+    def _highlight_viewport(self):
+        self._hl_after_id = None
+        if self._hl_lang is None:
+            return
+
+        try:
+            size = self.highlight_block_lines
+            first = int(self.preview_text.index("@0,0").split(".")[0])
+            last = int(self.preview_text.index(f"@0,{self.preview_text.winfo_height()}").split(".")[0])
+            total = int(self.preview_text.index("end-1c").split(".")[0])
+            start_block = max(0, (first - 1) // size - self.highlight_margin_blocks)
+            end_block = min((total - 1) // size, (last - 1) // size + self.highlight_margin_blocks)
+
+            for block in range(start_block, end_block + 1):
+                if block in self._hl_applied or block in self._hl_pending:
+                    continue
+
+                start = block * size + 1
+                complete = start + size <= total or self._text_pager is None or self._text_pager.at_end
+                spans = self.preview_cache.get(self._hl_key + (block,)) if complete else None
+                if spans is not None:
+                    self._apply_highlight(self._hl_gen, block, spans, True, False)
+                    continue
+
+                text = self.preview_text.get(f"{start}.0", f"{start + size}.0")
+                self._hl_pending.add(block)
+                self.thread_pool.submit(
+                    self._tokenize_block, self._hl_gen, self._hl_lang, block, text, start, complete
+                )
+
+        except Exception:
+            self.log_queue.put("_highlight_viewport exception:\n" + traceback.format_exc())
+
+    def _tokenize_block(self, gen, lang, block, text, start, complete):
+        try:
+            with self.metrics.timer("highlight_block"):
+                spans = SyntaxHighlighter.highlight(lang, text, start)
+            self.root.after(0, self._apply_highlight, gen, block, spans, complete, complete)
+
+        except Exception:
+            self.log_queue.put("_tokenize_block exception:\n" + traceback.format_exc())
+
+    def _apply_highlight(self, gen, block, spans, complete, store):
+        if gen != self._hl_gen:
+            return
+
+        try:
+            self._hl_pending.discard(block)
+            if store:
+                self.preview_cache.put(self._hl_key + (block,), spans)
+            for tag, indexes in spans.items():
+                self.preview_text.tag_add(f"hl_{tag}", *indexes)
+
+            total = int(self.preview_text.index("end-1c").split(".")[0])
+            if complete or (total - 1) // self.highlight_block_lines == block:
+                self._hl_applied.add(block)
+
+            else:
+                self._schedule_highlight()
+
+        except Exception:
+            self.log_queue.put("_apply_highlight exception:\n" + traceback.format_exc())
+
+    def _close_text_pager(self):
+        pager, self._text_pager = self._text_pager, None
+        self._text_page_loading = False
+        self._reset_highlight()
+        if pager is not None:
+            try:
+                pager.close()
+
+            except Exception:
+                pass
+
+    def _on_preview_scroll(self, first, last):
+        self.preview_scrollbar.set(first, last)
+        self._schedule_highlight()
+        pager = self._text_pager
+        if pager is None or pager.at_end or self._text_page_loading or float(last) < 0.85:
+            return
+
+        try:
+            self._text_page_loading = True
+            self.thread_pool.submit(self._load_text_page, pager)
+
+        except Exception:
+            self._text_page_loading = False
+            self.log_queue.put("_on_preview_scroll exception:\n" + traceback.format_exc())
+
+    def _load_text_page(self, pager):
+        content = ""
+        try:
+            content = pager.next_page()
+
+        except Exception:
+            self.log_queue.put("_load_text_page exception:\n" + traceback.format_exc())
+
+        finally:
+            self.root.after(0, self._append_text_page, pager, content)
+
+    def _append_text_page(self, pager, content):
+        if pager is not self._text_pager:
+            return
+
+        try:
+            self._text_page_loading = False
+            if content:
+                tail_block = (int(self.preview_text.index("end-1c").split(".")[0]) - 1) // self.highlight_block_lines
+                self.preview_text.config(state=NORMAL)
+                self.preview_text.insert(END, content)
+                self.preview_text.config(state=DISABLED)
+                self._hl_applied.discard(tail_block)
+                self._schedule_highlight()
+
+        except Exception:
+            self.log_queue.put("_append_text_page exception:\n" + traceback.format_exc())
+
     @staticmethod
     def _format_log_line(line):
+        if line.startswith("{"):
+            try:
+                return "\n".join(f"{k}: {v}" for k, v in json.loads(line).items())
+
+            except ValueError:
+                pass
+
         parts = re.split(r',\s*', line)
         res = []
         for p in parts:
@@ -747,18 +4480,160 @@ class QuanLog:
 
         return "\n".join(res)
 
+    def _on_preview_resize(self, event):
+        self._preview_box = (max(event.width - 20, 480), max(event.height - 10, 480))
+
+    def _warm_thumbnail(self, fp):
+        try:
+            if max(TilePyramid.image_size(fp)) <= self.tiled_min_side:
+                self.thumbnail_cache.get(fp, self._preview_box)
+
+        except ValueError:
+            pass
+
+        except Exception:
+            self.log_queue.put("_warm_thumbnail exception:\n" + traceback.format_exc())
+
     def _preview_image(self, fp):
         try:
-            img = Image.open(fp)
-            w = max(self.preview_frame.winfo_width() - 20, 480)
-            h = max(self.preview_frame.winfo_height() - 10, 480)
-            scale = min(w / img.width, h / img.height, 1)
-            img = img.resize((int(img.width * scale), int(img.height * scale)), Image.Resampling.LANCZOS)
+            if max(TilePyramid.image_size(fp)) > self.tiled_min_side:
+                try:
+                    info = self.tile_pyramid.info(fp)
+
+                except ValueError as e:
+                    self.log_queue.put(f"Showing a downscaled preview of {os.path.basename(fp)}: {e}")
+
+                else:
+                    self.root.after(0, self._start_tile_view, fp, info)
+                    return
+
+            with self.metrics.timer("preview_image"):
+                img = self._load_image_preview(fp)
             self.root.after(0, self._update_image_preview, img)
 
+        except (ValueError, Image.DecompressionBombError) as e:
+            self.log_queue.put(f"Cannot preview {os.path.basename(fp)}: {e}")
+
         except Exception:
             self.log_queue.put("_preview_image exception:\n" + traceback.format_exc())
 
+    def _tile_box(self):
+        label = self.preview_media_label
+        width, height = label.winfo_width(), label.winfo_height()
+        return (width, height) if width > 1 and height > 1 else self._preview_box
+
+    def _start_tile_view(self, fp, info):
+        label = getattr(self, "preview_media_label", None)
+        if not label:
+            return
+
+        try:
+            self._tile_view = {
+                "fp": fp, "info": info, "level": info["min_level"], "cx": info["width"] / 2, "cy": info["height"] / 2
+            }
+            label.bind("<ButtonPress-1>", self._on_tile_press)
+            label.bind("<B1-Motion>", self._on_tile_drag)
+            label.bind("<MouseWheel>", lambda e: self._zoom_tiles(-1 if e.delta > 0 else 1, e))
+            label.bind("<Button-4>", lambda e: self._zoom_tiles(-1, e))
+            label.bind("<Button-5>", lambda e: self._zoom_tiles(1, e))
+            label.bind("<Double-Button-1>", lambda e: self._fit_tiles())
+            self._fit_tiles()
+
+        except Exception:
+            self.log_queue.put("_start_tile_view exception:\n" + traceback.format_exc())
+
+    def _fit_tiles(self):
+        view = self._tile_view
+        if view is None:
+            return
+
+        info = view["info"]
+        bw, bh = self._tile_box()
+        ratio = max(info["width"] / bw, info["height"] / bh)
+        level = math.ceil(math.log2(ratio)) if ratio > 1 else 0
+        view["level"] = min(info["levels"], max(info["min_level"], level))
+        view["cx"], view["cy"] = info["width"] / 2, info["height"] / 2
+        self._render_tiles()
+
+    def _zoom_tiles(self, step, event):
+        view = self._tile_view
+        if view is None:
+            return
+
+        level = min(view["info"]["levels"], max(view["info"]["min_level"], view["level"] + step))
+        if level != view["level"]:
+            bw, bh = self._tile_box()
+            dx, dy = event.x - bw / 2, event.y - bh / 2
+            px, py = view["cx"] + dx * 2 ** view["level"], view["cy"] + dy * 2 ** view["level"]
+            view["level"] = level
+            view["cx"] = min(max(px - dx * 2 ** level, 0), view["info"]["width"])
+            view["cy"] = min(max(py - dy * 2 ** level, 0), view["info"]["height"])
+            self._render_tiles()
+        return "break"
+
+    def _on_tile_press(self, event):
+        self._tile_drag = (event.x, event.y)
+
+    def _on_tile_drag(self, event):
+        view = self._tile_view
+        if view is None or self._tile_drag is None:
+            return
+
+        scale = 2 ** view["level"]
+        view["cx"] = min(max(view["cx"] - (event.x - self._tile_drag[0]) * scale, 0), view["info"]["width"])
+        view["cy"] = min(max(view["cy"] - (event.y - self._tile_drag[1]) * scale, 0), view["info"]["height"])
+        self._tile_drag = (event.x, event.y)
+        self._render_tiles()
+
+    def _render_tiles(self):
+        if self._tile_view is None:
+            return
+
+        self._tile_gen += 1
+        if self._tile_rendering:
+            return
+
+        self._tile_rendering = True
+        self.thread_pool.submit(self._compose_tiles, self._tile_gen, dict(self._tile_view), self._tile_box())
+
+    def _compose_tiles(self, gen, view, box):
+        img = None
+        try:
+            info, level = view["info"], view["level"]
+            if not self.tile_pyramid.has_level(info, level):
+                self.log_queue.put(f"Building level {level} tiles: {os.path.basename(view['fp'])}")
+
+            with self.metrics.timer("tile_render"):
+                size = TilePyramid.TILE_SIZE
+                scale = 2 ** level
+                lw, lh = TilePyramid.level_size(info, level)
+                x0 = int(view["cx"] / scale - box[0] / 2)
+                y0 = int(view["cy"] / scale - box[1] / 2)
+                img = Image.new("RGB", box, (245, 245, 245))
+                for row in range(max(0, y0 // size), min((lh - 1) // size, (y0 + box[1] - 1) // size) + 1):
+                    for col in range(max(0, x0 // size), min((lw - 1) // size, (x0 + box[0] - 1) // size) + 1):
+                        key = ("tile", info["entry"], level, col, row)
+                        tile = self.preview_cache.get(key)
+                        if tile is None:
+                            tile = self.tile_pyramid.tile(view["fp"], info, level, col, row)
+                            self.preview_cache.put(key, tile)
+                        img.paste(tile, (col * size - x0, row * size - y0), tile if tile.mode == "RGBA" else None)
+
+        except Exception:
+            self.log_queue.put("_compose_tiles exception:\n" + traceback.format_exc())
+
+        self.root.after(0, self._show_tiles, gen, view["fp"], img)
+
+    def _show_tiles(self, gen, fp, img):
+        self._tile_rendering = False
+        if self._tile_view is None:
+            return
+
+        if img is not None and fp == self._tile_view["fp"]:
+            self._update_image_preview(img)
+        if gen != self._tile_gen:
+            self._render_tiles()
+
     def _update_image_preview(self, img):
         try:
             tkimg = ImageTk.PhotoImage(img)
@@ -768,11 +4643,61 @@ class QuanLog:
         except Exception:
             self.log_queue.put("_update_image_preview exception:\n" + traceback.format_exc())
 
+    def _show_video_previews(self, fp, meta):
+        if meta is None:
+            self.thread_pool.submit(self._extract_video_previews, fp)
+            return
+
+        if self.current_playing_video not in (None, fp) or not self.preview_media_label:
+            return
+
+        try:
+            if self.preview_media_label.image is None:
+                poster = ImageTk.PhotoImage(Image.open(meta["poster"]))
+                self.preview_media_label.config(image=poster)
+                self.preview_media_label.image = poster
+
+            if self.preview_strip is None:
+                self.preview_strip = ttkbs.Frame(self.preview_frame)
+                self.preview_strip.pack(side=BOTTOM, fill=X, before=self.preview_media_label)
+                self.preview_strip.images = []
+                for ms, path in meta["strip"]:
+                    thumb = ImageTk.PhotoImage(Image.open(path))
+                    self.preview_strip.images.append(thumb)
+                    ttkbs.Button(
+                        self.preview_strip, image=thumb, bootstyle=LINK,
+                        command=lambda ms=ms: self._seek_video(fp, ms)
+                    ).pack(side=LEFT, expand=True)
+
+        except Exception:
+            self.log_queue.put("_show_video_previews exception:\n" + traceback.format_exc())
+
+    def _extract_video_previews(self, fp):
+        try:
+            meta = self.video_thumbnailer.extract(fp, self._preview_box)
+            if meta is not None:
+                self.root.after(0, self._show_video_previews, fp, meta)
+
+        except Exception:
+            self.log_queue.put("_extract_video_previews exception:\n" + traceback.format_exc())
+
+    def _seek_video(self, fp, ms):
+        if self.preview_media_label:
+            self._play_video(fp, ms)
+
     def safe_stop_video(self):
         with self.video_lock:
             self.stop_video_flag = True
             self.is_playing_video = False
 
+        if self.preview_strip is not None:
+            try:
+                self.preview_strip.destroy()
+
+            except Exception:
+                pass
+            self.preview_strip = None
+
         if hasattr(self, "preview_media_label") and self.preview_media_label:
             try:
                 self.preview_media_label.config(image="")
@@ -783,8 +4708,9 @@ class QuanLog:
             self.preview_media_label = None
 
         try:
-            cv2.destroyAllWindows()
-            cv2.waitKey(1)
+            if cv2.loaded:
+                cv2.destroyAllWindows()
+                cv2.waitKey(1)
 
         except Exception:
             self.log_queue.put("safe_stop_video cv2.destroyAllWindows exception:\n" + traceback.format_exc())
@@ -792,12 +4718,20 @@ class QuanLog:
         self.current_playing_video = None
         self.video_play_locked = False
 
-    def _play_video(self, fp):
+    def _play_video(self, fp, start_ms=0):
         self.stop_video_flag = False
         self.current_playing_video = fp
         self.video_play_locked = True
+        self._video_session += 1
+        self._video_pending = None
+        self._video_clock = None
+        self._video_dropped = 0
+        frames = queue.Queue(maxsize=self.video_queue_size)
         try:
-            threading.Thread(target=self._video_worker, args=(fp,), daemon=True).start()
+            threading.Thread(
+                target=self._video_worker, args=(fp, self._video_session, frames, start_ms), daemon=True
+            ).start()
+            self.root.after(0, self._present_video_frame, self._video_session, frames)
 
         except Exception:
             self.log_queue.put("_play_video thread start exception:\n" + traceback.format_exc())
@@ -811,47 +4745,63 @@ class QuanLog:
             self.log_queue.put("_get_scaled_frame_size exception:\n" + traceback.format_exc())
             return fw, fh
 
-    def _video_worker(self, fp):
+    def _video_active(self, fp, session):
+        return (
+            not self.stop_video_flag and self.is_playing_video
+            and self.current_playing_video == fp and self._video_session == session
+        )
+
+    def _video_worker(self, fp, session, frames, start_ms=0):
         with self.video_lock:
             self.is_playing_video = True
         self.log_queue.put(f"Playing: {os.path.basename(fp)}")
         cap = None
 
         try:
-            cap = cv2.VideoCapture(fp)
+            source = self.video_proxy.get(fp) if self.video_proxy_enabled else None
+            cap = cv2.VideoCapture(source or fp)
             if not cap.isOpened():
                 self.log_queue.put(f"Failed to open video: {os.path.basename(fp)}")
-                self.safe_stop_video()
+                self.root.after(0, self.safe_stop_video)
                 return
-            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
-
-            try:
-                delay = 1 / max(fps, 15)
-
-            except Exception:
-                delay = 1 / 15.0
 
+            if start_ms:
+                cap.set(cv2.CAP_PROP_POS_MSEC, start_ms)
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
             w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            mw, mh = max(self.preview_frame.winfo_width() - 20, 1), max(self.preview_frame.winfo_height() - 10, 1)
-            dw, dh = self._get_scaled_frame_size(w, h, mw, mh)
+            dw, dh = self._get_scaled_frame_size(w, h, *self._preview_box)
+            index = 0
 
-            while not self.stop_video_flag and self.is_playing_video:
-                if self.current_playing_video != fp:
+            while self._video_active(fp, session):
+                if not cap.grab():
                     break
+                pts = cap.get(cv2.CAP_PROP_POS_MSEC) or start_ms + index * 1000.0 / fps
+                index += 1
 
-                ret, frame = cap.read()
-                if not ret:
-                    break
+                clock = self._video_clock
+                if clock is not None and clock + pts / 1000.0 < time.monotonic() - 1.0 / fps:
+                    self._video_dropped += 1
+                    continue
 
                 try:
-                    frame = cv2.resize(frame, (dw, dh), interpolation=cv2.INTER_AREA)
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    if (dw, dh) != (w, h):
+                        frame = cv2.resize(frame, (dw, dh), interpolation=cv2.INTER_AREA)
                     frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    img = ImageTk.PhotoImage(Image.fromarray(frame))
-                    self.root.after(0, self._update_video_frame, img)
 
                 except Exception:
                     self.log_queue.put("_video_worker frame processing exception:\n" + traceback.format_exc())
-                time.sleep(delay)
+                    continue
+
+                while self._video_active(fp, session):
+                    try:
+                        frames.put((pts, frame), timeout=0.1)
+                        break
+
+                    except queue.Full:
+                        continue
 
         except Exception:
             self.log_queue.put("_video_worker exception:\n" + traceback.format_exc())
@@ -870,10 +4820,61 @@ class QuanLog:
             except Exception:
                 pass
 
-            with self.video_lock:
-                self.is_playing_video = False
-            self.video_play_locked = False
-            self.log_queue.put(f"Stopped: {os.path.basename(fp)}")
+            while self._video_active(fp, session):
+                try:
+                    frames.put(None, timeout=0.1)
+                    break
+
+                except queue.Full:
+                    continue
+
+            if self._video_session == session:
+                with self.video_lock:
+                    self.is_playing_video = False
+                self.video_play_locked = False
+            self.log_queue.put(f"Stopped: {os.path.basename(fp)} ({self._video_dropped} frames dropped)")
+
+    def _present_video_frame(self, session, frames):
+        if session != self._video_session or self.stop_video_flag:
+            return
+
+        try:
+            while True:
+                if self._video_pending is None:
+                    try:
+                        self._video_pending = frames.get_nowait()
+
+                    except queue.Empty:
+                        self.root.after(5, self._present_video_frame, session, frames)
+                        return
+
+                    if self._video_pending is None:
+                        return
+
+                pts, frame = self._video_pending
+                now = time.monotonic()
+                if self._video_clock is None:
+                    self._video_clock = now - pts / 1000.0
+                due = self._video_clock + pts / 1000.0
+
+                if due < now - self.video_late_seconds and not frames.empty():
+                    self._video_pending = None
+                    self._video_dropped += 1
+                    continue
+
+                if due > now + 0.002:
+                    self.root.after(int((due - now) * 1000), self._present_video_frame, session, frames)
+                    return
+
+                self._video_pending = None
+                with self.metrics.timer("video_frame"):
+                    self._update_video_frame(ImageTk.PhotoImage(Image.fromarray(frame)))
+                self.metrics.gauge("video_dropped", self._video_dropped)
+                self.root.after(1, self._present_video_frame, session, frames)
+                return
+
+        except Exception:
+            self.log_queue.put("_present_video_frame exception:\n" + traceback.format_exc())
 
     def _update_video_frame(self, img):
         try:
@@ -887,9 +4888,21 @@ class QuanLog:
     def stop(self):
         try:
             self._stop_event.set()
+            self.watcher.stop()
+            self.log_writer.close()
             self.safe_stop_video()
             try:
                 self.thread_pool.shutdown(wait=False)
+                self.media_pool.shutdown(wait=False, cancel_futures=True)
+
+            except Exception:
+                pass
+
+            try:
+                self.file_index.close()
+                self.text_index.close()
+                self.blob_store.close()
+                packs.close()
 
             except Exception:
                 pass
@@ -906,6 +4919,9 @@ class QuanLog:
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+
     app = ttkbs.Window(themename="flatly")
     gui = QuanLog(app)
 
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+import zipfile
+import os
+
+import pytest
+
+import main
+
+
+TODAY = date(2026, 10, 18)
+
+
+def write_file(root, rel, data):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+@pytest.fixture
+def storage(tmp_path):
+    reader = main.PackReader()
+    yield main.ColdStorage(str(tmp_path), reader)
+    reader.close()
+
+
+def members(pack_path):
+    with zipfile.ZipFile(pack_path) as zf:
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+def test_due_months_skips_recent_and_non_archive_dirs(storage, tmp_path):
+    write_file(str(tmp_path), "2025/01/05/a.txt", b"a")
+    write_file(str(tmp_path), "2026/09/01/b.txt", b"b")
+    write_file(str(tmp_path), "2025/notes/c.txt", b"c")
+
+    assert storage.due_months(180, TODAY) == [os.path.join(str(tmp_path), "2025", "01")]
+
+
+def test_pack_month_moves_files_into_pack(storage, tmp_path):
+    root = str(tmp_path)
+    write_file(root, "2025/01/05/a.txt", b"alpha")
+    write_file(root, "2025/01/20/photo.jpg", b"\xff\xd8jpeg")
+    month_path = os.path.join(root, "2025", "01")
+
+    pack_path, packed = storage.pack_month(month_path)
+
+    assert pack_path == month_path + ".zip"
+    assert len(packed) == 2
+    assert not os.path.exists(month_path)
+    assert members(pack_path) == {"05/a.txt": b"alpha", "20/photo.jpg": b"\xff\xd8jpeg"}
+    assert storage.reader.read(os.path.join(pack_path, "05", "a.txt")) == b"alpha"
+    assert not [name for name in os.listdir(os.path.dirname(pack_path)) if name.endswith(".tmp")]
+
+
+def test_repack_renames_colliding_members(storage, tmp_path):
+    root = str(tmp_path)
+    month_path = os.path.join(root, "2025", "01")
+    write_file(root, "2025/01/05/a.txt", b"first")
+    pack_path, _ = storage.pack_month(month_path)
+
+    write_file(root, "2025/01/05/a.txt", b"second")
+    write_file(root, "2025/01/06/b.txt", b"other")
+    pack_path, packed = storage.pack_month(month_path)
+
+    assert len(packed) == 2
+    assert members(pack_path) == {"05/a.txt": b"first", "05/a-1.txt": b"second", "06/b.txt": b"other"}
+
+
+def test_repack_drops_loose_copy_already_in_pack(storage, tmp_path):
+    root = str(tmp_path)
+    month_path = os.path.join(root, "2025", "01")
+    write_file(root, "2025/01/05/a.txt", b"same")
+    pack_path, _ = storage.pack_month(month_path)
+
+    loose = write_file(root, "2025/01/05/a.txt", b"same")
+    _, packed = storage.pack_month(month_path)
+
+    assert packed == [loose]
+    assert not os.path.exists(loose)
+    assert members(pack_path) == {"05/a.txt": b"same"}
+
+
+def test_pack_month_cancelled_keeps_files(storage, tmp_path):
+    root = str(tmp_path)
+    month_path = os.path.join(root, "2025", "01")
+    path = write_file(root, "2025/01/05/a.txt", b"alpha")
+
+    with pytest.raises(InterruptedError):
+        storage.pack_month(month_path, cancelled=lambda: True)
+
+    assert os.path.isfile(path)
+    assert not os.path.exists(month_path + ".zip")
+    assert os.listdir(os.path.join(root, "2025")) == ["01"]
+
+
+def test_remove_member_keeps_the_rest(storage, tmp_path):
+    root = str(tmp_path)
+    month_path = os.path.join(root, "2025", "01")
+    write_file(root, "2025/01/05/a.txt", b"alpha")
+    write_file(root, "2025/01/05/b.txt", b"beta")
+    pack_path, _ = storage.pack_month(month_path)
+    storage.reader.members(pack_path)
+
+    storage.remove(os.path.join(pack_path, "05", "a.txt"))
+
+    assert members(pack_path) == {"05/b.txt": b"beta"}
+    assert not storage.reader.exists(os.path.join(pack_path, "05", "a.txt"))
+    assert storage.reader.read(os.path.join(pack_path, "05", "b.txt")) == b"beta"
+    assert not [name for name in os.listdir(os.path.dirname(pack_path)) if name.endswith(".tmp")]
+
+
+def test_remove_last_member_deletes_pack(storage, tmp_path):
+    root = str(tmp_path)
+    month_path = os.path.join(root, "2025", "01")
+    write_file(root, "2025/01/05/a.txt", b"alpha")
+    pack_path, _ = storage.pack_month(month_path)
+
+    storage.remove(os.path.join(pack_path, "05", "a.txt"))
+
+    assert not os.path.exists(pack_path)
+    assert os.listdir(os.path.dirname(pack_path)) == []